@@ -27,6 +27,8 @@ LOCUST_NAMESPACE="${LOCUST_NAMESPACE:-locust-operator}"
 RHDH_METRIC="${RHDH_METRIC:-true}"
 PSQL_EXPORT="${PSQL_EXPORT:-false}"
 ENABLE_ORCHESTRATOR="${ENABLE_ORCHESTRATOR:-false}"
+# Read by scenarios/complex-rbac.metrics.yaml through envsubst
+export AUTHORIZE_BATCH_MAX="${AUTHORIZE_BATCH_MAX:-0}"
 UPLOAD_TO_OPENSEARCH="${UPLOAD_TO_OPENSEARCH:-false}"
 PERFORM_REGRESSION="${PERFORM_REGRESSION:-false}"
 
@@ -268,6 +270,9 @@ if [ -f "scenarios/$benchmark_scenario.metrics.yaml" ]; then
     envsubst <"scenarios/$benchmark_scenario.metrics.yaml" >"${metrics_config_dir}/$benchmark_scenario.metrics.yaml"
     collect_additional_metrics "${metrics_config_dir}/$benchmark_scenario.metrics.yaml"
 fi
+#Results printed by the locust master (capacity search, latency histograms, time series, ...)
+echo "$(date -u -Ins) Extracting locust master artifacts"
+python3 ./ci-scripts/extract-locust-artifacts.py "$ARTIFACT_DIR/load-test.log" "$monitoring_collection_data" --timeseries "$ARTIFACT_DIR/timeseries.bin"
 #Postgresql specific metrics
 if [ "$PSQL_EXPORT" == "true" ]; then
     echo "$(date -u -Ins) Collecting Postgresql specific metrics (test)"
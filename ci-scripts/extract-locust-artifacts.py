@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""Merge the results printed by the locust master into benchmark.json.
+
+The scenarios print results Prometheus cannot scrape (capacity search steps,
+latency histograms, ...) to the master log as `[ARTIFACT] <dotted.key> <json>`
+lines (see scenarios/common/artifacts.py). Each of them is set under its key
+in benchmark.json, a later line with the same key wins.
+
+With --timeseries the per second time series (`[TIMESERIES] <base64>` lines, see
+scenarios/common/timeseries.py) are written to a file as a sequence of chunks,
+each a little endian uint32 length followed by the zlib compressed chunk.
+read_timeseries() reads them back as one dict of columns per chunk.
+
+Usage:
+    python extract-locust-artifacts.py load-test.log benchmark.json [--timeseries timeseries.bin]
+"""
+
+import argparse
+import base64
+import binascii
+import json
+import logging
+import re
+import struct
+import sys
+import zlib
+from array import array
+from pathlib import Path
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(message)s",
+)
+log = logging.getLogger(__name__)
+
+ARTIFACT_RE = re.compile(r"\[ARTIFACT\] (\S+) (.*)$")
+TIMESERIES_RE = re.compile(r"\[TIMESERIES\] (\S+)$")
+
+
+def decode_chunk(compressed: bytes) -> dict:
+    payload = zlib.decompress(compressed)
+    header, _, data = payload.partition(b"\n")
+    header = json.loads(header)
+    chunk = {"version": header["version"], "names": header["names"]}
+    # The arrays are little endian, chunks without a byteorder come from little endian workers
+    swap = header.get("byteorder", "little") != sys.byteorder
+    offset = 0
+    for name, typecode, length in header["columns"]:
+        column = array(typecode)
+        size = column.itemsize * length
+        column.frombytes(data[offset:offset + size])
+        if swap:
+            column.byteswap()
+        chunk[name] = column
+        offset += size
+    return chunk
+
+
+def read_timeseries(path: Path):
+    with open(path, "rb") as f:
+        while header := f.read(4):
+            (length,) = struct.unpack("<I", header)
+            yield decode_chunk(f.read(length))
+
+
+def read_log(log_file: Path) -> tuple[dict, list]:
+    artifacts = {}
+    chunks = []
+    with open(log_file, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            m = ARTIFACT_RE.search(line)
+            if m:
+                try:
+                    artifacts[m.group(1)] = json.loads(m.group(2))
+                except json.JSONDecodeError as e:
+                    log.warning("Skipping malformed artifact %s: %s", m.group(1), e)
+                continue
+            m = TIMESERIES_RE.search(line)
+            if m:
+                try:
+                    compressed = base64.b64decode(m.group(1), validate=True)
+                    decode_chunk(compressed)
+                except (binascii.Error, zlib.error, ValueError, KeyError) as e:
+                    log.warning("Skipping malformed time series chunk: %s", e)
+                    continue
+                chunks.append(compressed)
+    return artifacts, chunks
+
+
+def write_timeseries(path: Path, chunks: list) -> None:
+    with open(path, "wb") as f:
+        for compressed in chunks:
+            f.write(struct.pack("<I", len(compressed)))
+            f.write(compressed)
+
+
+def set_dotted(data: dict, key: str, value) -> None:
+    *parents, leaf = key.split(".")
+    for part in parents:
+        if not isinstance(data.get(part), dict):
+            data[part] = {}
+        data = data[part]
+    data[leaf] = value
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("log_file", type=Path, help="locust master log (load-test.log)")
+    parser.add_argument("benchmark", type=Path, help="benchmark.json to update")
+    parser.add_argument("--timeseries", type=Path, help="file to write the per second time series to")
+    args = parser.parse_args()
+
+    if not args.log_file.is_file():
+        log.warning("%s not found, nothing to extract", args.log_file)
+        return
+    artifacts, chunks = read_log(args.log_file)
+    if args.timeseries and chunks:
+        write_timeseries(args.timeseries, chunks)
+        log.info("Wrote %d time series chunk(s) to %s", len(chunks), args.timeseries)
+    if not artifacts:
+        log.info("No artifacts in %s", args.log_file)
+        return
+
+    data = json.loads(args.benchmark.read_text()) if args.benchmark.is_file() else {}
+    for key, value in artifacts.items():
+        set_dotted(data, key, value)
+        log.info("Set %s in %s", key, args.benchmark)
+    args.benchmark.write_text(json.dumps(data, indent=4, sort_keys=True))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""Measure how fast benchmark.json files are ingested, against the local OpenSearch stand-in.
+
+Runs the pipeline of upload_benchmark.py (parse and transform in --jobs processes,
+streaming bulk of --chunk-size documents) twice: without uploading, to time the
+parsing alone, then into fake_opensearch.FakeOpenSearch. Reports the files and MB
+per second, the documents indexed and rejected (by error type) and the fields of
+the resulting mapping against index.mapping.total_fields.limit, so that mapping
+explosions and throughput regressions show up without a cluster.
+
+Without paths a synthetic corpus is generated: --files benchmark.json files with
+--request-names request names each (complex-rbac.py alone produces dozens) and
+--series-points raw samples per series to make the files realistically large.
+
+Usage:
+    python benchmark_ingest.py /path/to/artifacts/
+    python benchmark_ingest.py --files 200 --request-names 60 --series-points 20000
+    python benchmark_ingest.py --files 50 --output ingest.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import resource
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+import upload_benchmark
+from fake_opensearch import FakeOpenSearch, count_fields
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(message)s",
+)
+log = logging.getLogger(__name__)
+
+METRICS = [
+    "locust_requests_avg_response_time",
+    "locust_requests_current_rps",
+    "locust_requests_num_failures",
+    "locust_requests_avg_content_length",
+]
+STATS = ["min", "max", "mean", "median", "percentile90", "percentile95", "percentile99", "percentile999"]
+
+
+def _stats(rng: random.Random, samples: int) -> dict:
+    stats = {s: round(rng.uniform(1, 1000), 3) for s in STATS}
+    stats["samples"] = [[1700000000 + i * 15, round(rng.uniform(1, 1000), 3)] for i in range(samples)]
+    return stats
+
+
+def generate_corpus(directory: Path, files: int, request_names: int, series_points: int, seed: int = 42) -> None:
+    """Write benchmark.json files shaped like the ones of collect-results.sh."""
+    rng = random.Random(seed)
+    names = [f"[catalog] /api/catalog/entities/by-name/component/default/c-{j}|ALLOW" for j in range(request_names)]
+    for i in range(files):
+        benchmark = {
+            "name": "rhdh-perf-workload",
+            "started": f"2025-01-01T00:{i // 60 % 60:02d}:{i % 60:02d}.000000+00:00",
+            "metadata": {
+                "env": {"BUILD_ID": str(1000 + i), "USERS": "100", "WORKERS": "5", "SPAWN_RATE": "20",
+                        "COMPONENT_COUNT": "1000", "API_COUNT": "1000", "RBAC_POLICY": "complex"},
+                "scenario": {"name": "complex-rbac", "version": "1"},
+                "scalability": {"iteration": i},
+            },
+            "measurements": {
+                "timings": {"benchmark": {"duration": 600.0}, "deploy": {"duration": 300.0}},
+                "rhdh-developer-hub": {m: _stats(rng, series_points) for m in ("cpu", "memory", "count_ready")},
+                "rhdh-postgresql": {m: _stats(rng, series_points) for m in ("cpu", "memory", "count_ready")},
+            },
+            "results": {
+                name: {m: _stats(rng, 0) for m in METRICS}
+                for name in ["Aggregated"] + names
+            },
+        }
+        path = directory / f"{i:05d}" / "benchmark.json"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(benchmark, f)
+
+
+def run(files: list[Path], client, jobs: int, chunk_size: int, schema_version: int) -> dict:
+    pending = {}
+    summary = {"indexed": 0, "unchanged": 0, "failed": 0}
+    errors = Counter()
+    docs = upload_benchmark.load_documents(files, upload_benchmark.Ledger(None, schema_version), pending, summary, jobs)
+    started = time.monotonic()
+    if client is None:
+        summary["parsed"] = sum(1 for _ in docs)
+    else:
+        for doc_id, ok, result in upload_benchmark.upload_documents(client, docs, chunk_size, 0):
+            pending.pop(doc_id, None)
+            if ok:
+                summary["indexed"] += 1
+            else:
+                summary["failed"] += 1
+                errors[result.get("error", {}).get("type", "unknown")] += 1
+    summary["seconds"] = round(time.monotonic() - started, 3)
+    if errors:
+        summary["errors"] = dict(errors)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="*", help="benchmark.json file(s) or directories, default a synthetic corpus")
+    parser.add_argument("--files", type=int, default=100, help="synthetic files (default: 100)")
+    parser.add_argument("--request-names", type=int, default=40, help="request names per synthetic file")
+    parser.add_argument("--series-points", type=int, default=5000, help="raw samples per synthetic series")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="parser processes")
+    parser.add_argument("--chunk-size", type=int, default=100, help="documents per bulk request")
+    parser.add_argument("--schema-version", type=int, choices=upload_benchmark.SCHEMA_VERSIONS, default=1,
+                        help="document layout to ingest (see upload_benchmark.py)")
+    parser.add_argument("--sink", type=Path, help="directory of a file backed stand-in, default in memory")
+    parser.add_argument("--output", type=Path, help="also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    # The per document lines of the upload are not wanted here
+    logging.getLogger(upload_benchmark.__name__).setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory(prefix="benchmark-ingest-") as tmp:
+        if args.paths:
+            files = upload_benchmark.find_benchmark_files(args.paths)
+        else:
+            log.info("Generating %d synthetic benchmark.json file(s) in %s", args.files, tmp)
+            generate_corpus(Path(tmp), args.files, args.request_names, args.series_points)
+            files = upload_benchmark.find_benchmark_files([tmp])
+        size_mb = sum(f.stat().st_size for f in files) / 2**20
+        log.info("Ingesting %d file(s), %.1f MB, with %d job(s)", len(files), size_mb, args.jobs)
+
+        parse = run(files, None, args.jobs, args.chunk_size, args.schema_version)
+        client = FakeOpenSearch(args.sink) if args.sink else FakeOpenSearch()
+        upload_benchmark.ensure_index(client)
+        ingest = run(files, client, args.jobs, args.chunk_size, args.schema_version)
+
+    index = upload_benchmark.INDEX_NAME
+    mapping = client.indices.get_mapping(index=index)[index]["mappings"]["properties"]
+    limit = client.indices.get_settings(index=index)[index]["settings"]["index.mapping.total_fields.limit"]
+    results = {
+        "files": len(files),
+        "megabytes": round(size_mb, 1),
+        "jobs": args.jobs,
+        "chunk_size": args.chunk_size,
+        "schema_version": args.schema_version,
+        "parse": parse,
+        "ingest": ingest,
+        "files_per_second": round(len(files) / ingest["seconds"], 1) if ingest["seconds"] else None,
+        "megabytes_per_second": round(size_mb / ingest["seconds"], 1) if ingest["seconds"] else None,
+        "mapping_fields": count_fields(mapping),
+        "mapping_results_fields": count_fields(mapping.get("results", {}).get("properties", {})),
+        "total_fields_limit": int(limit),
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024,
+        "max_rss_children_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss // 1024,
+    }
+
+    log.info(
+        "Parsed %d file(s) in %.2fs, ingested in %.2fs (%s files/s, %s MB/s), %d indexed, %d failed",
+        parse["parsed"],
+        parse["seconds"],
+        ingest["seconds"],
+        results["files_per_second"],
+        results["megabytes_per_second"],
+        ingest["indexed"],
+        ingest["failed"],
+    )
+    log.info("Mapping has %d of %d fields", results["mapping_fields"], results["total_fields_limit"])
+    for error, count in ingest.get("errors", {}).items():
+        log.warning("%d document(s) rejected with %s", count, error)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,456 @@
+#!/usr/bin/env python3
+"""In-process stand-in for the OpenSearch calls made by upload_benchmark.py.
+
+Implements info(), indices.exists/create/put_mapping/get_mapping/delete, bulk(),
+index(), get() and count() with the mapping rules that matter for our documents:
+
+  - dynamic mapping of new fields (long, float, boolean, date detection, text with
+    a keyword sub-field, object), honouring "dynamic": true/false/"strict"
+  - values that do not fit the mapped type (e.g. an object where a number was
+    mapped) are rejected with mapper_parsing_exception
+  - index.mapping.total_fields.limit and index.mapping.depth.limit, a document that
+    would add too many fields is rejected and the mapping is left unchanged
+  - index.mapping.nested_objects.limit, the nested objects of a document
+  - changing the type of a mapped field in put_mapping is rejected
+
+Errors are raised as the opensearchpy exceptions and bulk items carry the same
+status and error types as a real cluster, so the upload code runs unchanged.
+
+With a path the indexes are kept in a directory, one sub-directory per index with
+mapping.json and the documents appended to documents.ndjson. upload_benchmark.py
+uses it for OPENSEARCH_URL=file:///some/dir, to check documents and mappings
+offline:
+
+    OPENSEARCH_URL=file:///tmp/sink python upload_benchmark.py /path/to/artifacts/
+"""
+
+import copy
+import json
+import re
+from pathlib import Path
+
+from opensearchpy.exceptions import NotFoundError, RequestError
+from opensearchpy.serializer import JSONSerializer
+
+FAKE_VERSION = "2.11.0-fake"
+
+DEFAULT_TOTAL_FIELDS_LIMIT = 1000
+DEFAULT_DEPTH_LIMIT = 20
+DEFAULT_NESTED_OBJECTS_LIMIT = 10000
+
+# strict_date_optional_time, the default dynamic date format
+_DATE_RE = re.compile(
+    r"^\d{4}(-\d{2}(-\d{2}(T\d{2}(:\d{2}(:\d{2}([.,]\d{1,9})?)?)?(Z|[+-]\d{2}(:?\d{2})?)?)?)?)?$"
+)
+
+_INTEGER_RANGES = {
+    "byte": (-2**7, 2**7 - 1),
+    "short": (-2**15, 2**15 - 1),
+    "integer": (-2**31, 2**31 - 1),
+    "long": (-2**63, 2**63 - 1),
+}
+_FLOAT_TYPES = {"float", "double", "half_float", "scaled_float"}
+
+
+class MappingError(Exception):
+    def __init__(self, error_type: str, reason: str):
+        super().__init__(reason)
+        self.error_type = error_type
+        self.reason = reason
+
+    def to_dict(self) -> dict:
+        return {"type": self.error_type, "reason": self.reason}
+
+
+def _flatten_settings(settings: dict, prefix: str = "") -> dict:
+    out = {}
+    for key, value in settings.items():
+        if isinstance(value, dict):
+            out.update(_flatten_settings(value, f"{prefix}{key}."))
+        else:
+            out[f"{prefix}{key}"] = value
+    if not prefix:
+        # "number_of_shards" and "index.number_of_shards" are the same setting
+        out = {k if k.startswith("index.") else f"index.{k}": v for k, v in out.items()}
+    return out
+
+
+def _dynamic(value, inherited: str) -> str:
+    if value is None:
+        return inherited
+    return str(value).lower()
+
+
+def count_fields(properties: dict) -> int:
+    """Number of fields counted against total_fields.limit (objects, leaves and sub-fields)."""
+    total = 0
+    for field in properties.values():
+        total += 1 + len(field.get("fields", {}))
+        total += count_fields(field.get("properties", {}))
+    return total
+
+
+def _dynamic_field(value):
+    """Mapping of a new field from its first value, None when it cannot be told yet."""
+    if isinstance(value, list):
+        return next((f for f in (_dynamic_field(v) for v in value) if f is not None), None)
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return {"type": "boolean"}
+    if isinstance(value, int):
+        return {"type": "long"}
+    if isinstance(value, float):
+        return {"type": "float"}
+    if isinstance(value, dict):
+        return {"type": "object", "properties": {}}
+    if _DATE_RE.match(str(value)):
+        return {"type": "date"}
+    return {"type": "text", "fields": {"keyword": {"type": "keyword", "ignore_above": 256}}}
+
+
+def _check_leaf(field_type: str, value, path: str) -> None:
+    def fail():
+        raise MappingError("mapper_parsing_exception", f"failed to parse field [{path}] of type [{field_type}]")
+
+    if isinstance(value, dict):
+        fail()
+    if field_type in _INTEGER_RANGES:
+        if isinstance(value, bool):
+            fail()
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            fail()
+        low, high = _INTEGER_RANGES[field_type]
+        if number != number or not low <= int(number) <= high:
+            fail()
+    elif field_type in _FLOAT_TYPES:
+        if isinstance(value, bool):
+            fail()
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            fail()
+        if number != number or number in (float("inf"), float("-inf")):
+            fail()
+    elif field_type == "boolean":
+        if value not in (True, False, "true", "false", ""):
+            fail()
+    elif field_type == "date":
+        if isinstance(value, bool) or not (isinstance(value, (int, float)) or _DATE_RE.match(str(value))):
+            fail()
+
+
+class _Index:
+    def __init__(self, mappings: dict = None, settings: dict = None):
+        self.mappings = {"properties": {}}
+        self.settings = _flatten_settings(settings or {})
+        self.documents = {}
+        self.ids = set()
+        if mappings:
+            self.put_mapping(mappings)
+
+    @property
+    def total_fields_limit(self) -> int:
+        return int(self.settings.get("index.mapping.total_fields.limit", DEFAULT_TOTAL_FIELDS_LIMIT))
+
+    @property
+    def depth_limit(self) -> int:
+        return int(self.settings.get("index.mapping.depth.limit", DEFAULT_DEPTH_LIMIT))
+
+    @property
+    def nested_objects_limit(self) -> int:
+        return int(self.settings.get("index.mapping.nested_objects.limit", DEFAULT_NESTED_OBJECTS_LIMIT))
+
+    def _check_total_fields(self, properties: dict, added: int = 0) -> None:
+        total = count_fields(properties) + added
+        if total > self.total_fields_limit:
+            raise MappingError(
+                "illegal_argument_exception",
+                f"Limit of total fields [{self.total_fields_limit}] has been exceeded ({total} fields)",
+            )
+
+    def put_mapping(self, body: dict) -> None:
+        merged = copy.deepcopy(self.mappings)
+        if "dynamic" in body:
+            merged["dynamic"] = body["dynamic"]
+        self._merge(merged["properties"], body.get("properties", {}), "")
+        self._check_total_fields(merged["properties"])
+        self.mappings = merged
+
+    def _merge(self, current: dict, new: dict, prefix: str) -> None:
+        for name, field in new.items():
+            path = f"{prefix}{name}"
+            if name not in current:
+                current[name] = copy.deepcopy(field)
+                continue
+            old_type = current[name].get("type", "object")
+            new_type = field.get("type", "object")
+            if old_type != new_type:
+                raise MappingError(
+                    "illegal_argument_exception",
+                    f"mapper [{path}] cannot be changed from type [{old_type}] to [{new_type}]",
+                )
+            if "dynamic" in field:
+                current[name]["dynamic"] = field["dynamic"]
+            if "properties" in field:
+                self._merge(current[name].setdefault("properties", {}), field["properties"], f"{path}.")
+
+    def parse(self, source: dict) -> int:
+        """Validate a document and add the fields it introduces, all or nothing."""
+        pending = {}
+        self._nested_objects = 0
+        added = self._parse_object(self.mappings["properties"], pending, source,
+                                   _dynamic(self.mappings.get("dynamic"), "true"), "", 1)
+        if added:
+            self._check_total_fields(self.mappings["properties"], added)
+            self._apply(self.mappings["properties"], pending)
+        return added
+
+    def _parse_object(self, properties: dict, pending: dict, obj: dict, dynamic: str, prefix: str, depth: int) -> int:
+        if depth > self.depth_limit:
+            raise MappingError(
+                "illegal_argument_exception",
+                f"Limit of mapping depth [{self.depth_limit}] has been exceeded due to object field [{prefix[:-1]}]",
+            )
+        added = 0
+        for name, value in obj.items():
+            if "." in name:
+                # "a.b": 1 is the same as "a": {"b": 1}
+                head, _, rest = name.partition(".")
+                name, value = head, {rest: value}
+            path = f"{prefix}{name}"
+            field = properties.get(name) or pending.get(name)
+            if field is None:
+                if dynamic == "strict":
+                    raise MappingError(
+                        "strict_dynamic_mapping_exception",
+                        f"mapping set to strict, dynamic introduction of [{name}] within "
+                        f"[{prefix[:-1] or '_doc'}] is not allowed",
+                    )
+                if dynamic == "false":
+                    continue
+                field = _dynamic_field(value)
+                if field is None:
+                    continue
+                pending[name] = field
+                added += 1 + len(field.get("fields", {}))
+            added += self._parse_value(name, field, properties, pending, value, dynamic, path, depth)
+        return added
+
+    def _parse_value(self, name, field, properties, pending, value, dynamic, path, depth) -> int:
+        if isinstance(value, list):
+            return sum(self._parse_value(name, field, properties, pending, v, dynamic, path, depth) for v in value)
+        if value is None:
+            return 0
+        field_type = field.get("type", "object")
+        if field_type not in ("object", "nested"):
+            _check_leaf(field_type, value, path)
+            return 0
+        if not isinstance(value, dict):
+            raise MappingError(
+                "mapper_parsing_exception",
+                f"object mapping for [{path}] tried to parse field [{name}] as object, but found a concrete value",
+            )
+        if field_type == "nested":
+            self._nested_objects += 1
+            if self._nested_objects > self.nested_objects_limit:
+                raise MappingError(
+                    "illegal_argument_exception",
+                    f"The number of nested documents has exceeded the allowed limit of "
+                    f"[{self.nested_objects_limit}]",
+                )
+        if name in properties:
+            # Fields new to a mapped object go to a pending object merged on success
+            sub_properties = field.setdefault("properties", {})
+            sub_pending = pending.setdefault(name, {"properties": {}})["properties"]
+        else:
+            sub_properties = sub_pending = field["properties"]
+        return self._parse_object(sub_properties, sub_pending, value,
+                                  _dynamic(field.get("dynamic"), dynamic), f"{path}.", depth + 1)
+
+    def _apply(self, properties: dict, pending: dict) -> None:
+        for name, field in pending.items():
+            if name not in properties:
+                properties[name] = field
+            elif field.get("properties"):
+                self._apply(properties[name].setdefault("properties", {}), field["properties"])
+
+
+class _Indices:
+    def __init__(self, client):
+        self.client = client
+
+    def exists(self, index, **_kwargs) -> bool:
+        return index in self.client._indexes
+
+    def create(self, index, body=None, **_kwargs) -> dict:
+        if index in self.client._indexes:
+            raise RequestError(400, "resource_already_exists_exception", f"index [{index}] already exists")
+        body = body or {}
+        try:
+            self.client._indexes[index] = _Index(body.get("mappings"), body.get("settings"))
+        except MappingError as e:
+            raise RequestError(400, e.error_type, e.to_dict())
+        self.client._save(index)
+        return {"acknowledged": True, "index": index}
+
+    def put_mapping(self, body, index=None, **_kwargs) -> dict:
+        try:
+            self.client._index(index).put_mapping(body)
+        except MappingError as e:
+            raise RequestError(400, e.error_type, e.to_dict())
+        self.client._save(index)
+        return {"acknowledged": True}
+
+    def get_mapping(self, index=None, **_kwargs) -> dict:
+        return {index: {"mappings": copy.deepcopy(self.client._index(index).mappings)}}
+
+    def get_settings(self, index=None, **_kwargs) -> dict:
+        return {index: {"settings": dict(self.client._index(index).settings)}}
+
+    def delete(self, index, **_kwargs) -> dict:
+        self.client._index(index)
+        del self.client._indexes[index]
+        if self.client.path:
+            for name in ("mapping.json", "documents.ndjson"):
+                (self.client.path / index / name).unlink(missing_ok=True)
+        return {"acknowledged": True}
+
+
+class FakeOpenSearch:
+    """Drop-in for the opensearchpy.OpenSearch client used by upload_benchmark.py."""
+
+    def __init__(self, path=None):
+        self.path = Path(path) if path else None
+        self.transport = type("Transport", (), {"serializer": JSONSerializer()})()
+        self.indices = _Indices(self)
+        self._indexes = {}
+        if self.path:
+            self.path.mkdir(parents=True, exist_ok=True)
+            for mapping_file in sorted(self.path.glob("*/mapping.json")):
+                self._load(mapping_file.parent)
+
+    def _load(self, directory: Path) -> None:
+        with open(directory / "mapping.json") as f:
+            data = json.load(f)
+        index = _Index(data["mappings"], data["settings"])
+        documents = directory / "documents.ndjson"
+        if documents.is_file():
+            # Only the IDs are kept in memory, the file is the store
+            for doc_id, source in self._read_documents(directory.name):
+                if source is None:
+                    index.ids.discard(doc_id)
+                else:
+                    index.ids.add(doc_id)
+        self._indexes[directory.name] = index
+
+    def _save(self, name: str) -> None:
+        if not self.path:
+            return
+        index = self._indexes[name]
+        directory = self.path / name
+        directory.mkdir(exist_ok=True)
+        with open(directory / "mapping.json", "w") as f:
+            json.dump({"mappings": index.mappings, "settings": index.settings}, f, indent=1, sort_keys=True)
+
+    def _read_documents(self, name: str):
+        # (id, source) of the lines of documents.ndjson, source None for a deletion
+        with open(self.path / name / "documents.ndjson") as f:
+            for line in f:
+                if line.strip():
+                    doc = json.loads(line)
+                    yield doc["_id"], doc.get("_source")
+
+    def _append(self, name: str, doc: dict) -> None:
+        with open(self.path / name / "documents.ndjson", "a") as f:
+            f.write(json.dumps(doc, separators=(",", ":")) + "\n")
+
+    def _index(self, name: str) -> _Index:
+        if name not in self._indexes:
+            raise NotFoundError(404, "index_not_found_exception", f"no such index [{name}]")
+        return self._indexes[name]
+
+    def _store(self, name: str, doc_id: str, source: dict) -> str:
+        index = self._index(name)
+        result = "updated" if doc_id in index.ids else "created"
+        index.ids.add(doc_id)
+        if self.path:
+            self._append(name, {"_id": doc_id, "_source": source})
+        else:
+            index.documents[doc_id] = source
+        return result
+
+    def info(self, **_kwargs) -> dict:
+        return {"version": {"number": FAKE_VERSION}, "tagline": "The OpenSearch Project: https://opensearch.org/"}
+
+    def _index_document(self, name: str, doc_id, source: dict, op_type: str = "index") -> dict:
+        item = {"_index": name, "_id": doc_id}
+        if name not in self._indexes:
+            # Auto-creation with dynamic mapping and the default limits
+            self._indexes[name] = _Index()
+        index = self._indexes[name]
+        if op_type == "create" and doc_id in index.ids:
+            return {**item, "status": 409, "error": {
+                "type": "version_conflict_engine_exception",
+                "reason": f"[{doc_id}]: version conflict, document already exists",
+            }}
+        try:
+            added = index.parse(source)
+        except MappingError as e:
+            return {**item, "status": 400, "error": e.to_dict()}
+        if added:
+            self._save(name)
+        result = self._store(name, doc_id, source)
+        return {**item, "result": result, "status": 201 if result == "created" else 200}
+
+    def bulk(self, body, index=None, **_kwargs) -> dict:
+        if isinstance(body, (bytes, bytearray)):
+            body = body.decode()
+        lines = body.splitlines() if isinstance(body, str) else [json.dumps(line) for line in body]
+        lines = iter(line for line in lines if line.strip())
+        items = []
+        for line in lines:
+            action = json.loads(line)
+            op_type, meta = next(iter(action.items()))
+            name = meta.get("_index", index)
+            doc_id = meta.get("_id")
+            if op_type == "delete":
+                existed = name in self._indexes and doc_id in self._indexes[name].ids
+                if existed:
+                    self._indexes[name].ids.discard(doc_id)
+                    self._indexes[name].documents.pop(doc_id, None)
+                    if self.path:
+                        self._append(name, {"_id": doc_id})
+                items.append({"delete": {"_index": name, "_id": doc_id, "result": "deleted" if existed else "not_found",
+                                         "status": 200 if existed else 404}})
+                continue
+            source = json.loads(next(lines))
+            if op_type == "update":
+                source = source.get("doc", {})
+            items.append({op_type: self._index_document(name, doc_id, source, op_type)})
+        return {
+            "took": 0,
+            "errors": any("error" in next(iter(item.values())) for item in items),
+            "items": items,
+        }
+
+    def index(self, index, body, id=None, **_kwargs) -> dict:
+        item = self._index_document(index, id, body)
+        if "error" in item:
+            raise RequestError(item["status"], item["error"]["type"], item["error"])
+        return item
+
+    def get(self, index, id, **_kwargs) -> dict:
+        source = self._index(index).documents.get(id)
+        if self.path and id in self._indexes[index].ids:
+            for doc_id, doc_source in self._read_documents(index):
+                if doc_id == id:
+                    source = doc_source
+        if source is None:
+            raise NotFoundError(404, "not_found", {"_index": index, "_id": id, "found": False})
+        return {"_index": index, "_id": id, "found": True, "_source": source}
+
+    def count(self, index=None, **_kwargs) -> dict:
+        return {"count": len(self._index(index).ids)}
@@ -6,10 +6,31 @@ into OpenSearch with proper timestamps for Kibana/Grafana dashboards.
 
 Usage:
     python upload_benchmark.py benchmark.json [benchmark2.json ...]
-    python upload_benchmark.py --dir /path/to/artifacts/
+    python upload_benchmark.py /path/to/artifacts/
+    python upload_benchmark.py --ledger ~/.rhdh-upload-ledger.json /path/to/archive/
+
+The files are parsed by a pool of processes (--jobs) and sent in bulk requests of
+--chunk-size documents as they are parsed, the memory used depends on these and
+not on the number of files.
+
+Document schema versions (--schema-version, default $OPENSEARCH_SCHEMA_VERSION or 1):
+    1  results as one object field per sanitized request name, the number of index
+       fields grows with the request names of the scenarios
+    2  results as the nested `result_stats` array of {request, metric, stat, value},
+       the fields stay the same whatever the request names
+Every document has its `schema_version`. To migrate, upload the archive again with
+--schema-version 2 to a new OPENSEARCH_INDEX (fields cannot be removed from the
+mapping of an existing index) and point the dashboards at it, filtering on
+schema_version while both layouts are in use. A --ledger re-sends the files uploaded
+with another schema version.
+
+With --ledger the files uploaded are recorded (path, mtime, size and sha256 per
+index) and skipped by the next runs unless their content changed, unchanged files
+are not even parsed, so re-uploading an archive only sends the new results.
 
 Environment variables:
-    OPENSEARCH_URL      - OpenSearch endpoint (e.g. https://...es.amazonaws.com)
+    OPENSEARCH_URL      - OpenSearch endpoint (e.g. https://...es.amazonaws.com), or
+                          file:///some/dir for the local stand-in (fake_opensearch.py)
     OPENSEARCH_USER     - Master username (default: admin)
     OPENSEARCH_PASSWORD - Master password
     OPENSEARCH_INDEX    - Index name (default: rhdh-performance.default)
@@ -22,6 +43,8 @@ import logging
 import os
 import re
 import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timezone
 from pathlib import Path
 
@@ -35,6 +58,10 @@ log = logging.getLogger(__name__)
 
 # ---------------------------------------------------------------------------
 
+LEDGER_VERSION = 1
+
+SCHEMA_VERSIONS = (1, 2)
+
 INDEX_NAME = os.environ.get("OPENSEARCH_INDEX", "rhdh-performance.default")
 
 INDEX_MAPPING = {
@@ -78,8 +105,29 @@ INDEX_MAPPING = {
             "scalability_iteration": {"type": "integer"},
             "rhdh_image_digest": {"type": "keyword"},
             "rhdh_release_tag": {"type": "keyword"},
+            "schema_version": {"type": "integer"},
             "measurements": {"type": "object", "dynamic": True},
             "results": {"type": "object", "dynamic": True},
+            "result_stats": {
+                "type": "nested",
+                "properties": {
+                    "request": {"type": "keyword"},
+                    "metric": {"type": "keyword"},
+                    "stat": {"type": "keyword"},
+                    "value": {"type": "double"},
+                },
+            },
+            "histograms": {
+                "type": "nested",
+                "properties": {
+                    "name": {"type": "keyword"},
+                    "type": {"type": "keyword"},
+                    "count": {"type": "long"},
+                    "failures": {"type": "long"},
+                    "buckets": {"type": "long", "index": False},
+                    "counts": {"type": "long", "index": False},
+                },
+            },
             "timings": {
                 "properties": {
                     "benchmark_duration": {"type": "float"},
@@ -104,6 +152,13 @@ def connect_opensearch() -> OpenSearch:
         log.error("OPENSEARCH_URL environment variable is required")
         sys.exit(1)
 
+    if url.startswith("file://"):
+        from fake_opensearch import FakeOpenSearch
+
+        path = url[len("file://"):]
+        log.info("Writing to the local OpenSearch stand-in in %s", path)
+        return FakeOpenSearch(path)
+
     user = os.environ.get("OPENSEARCH_USER", "admin")
     password = os.environ.get("OPENSEARCH_PASSWORD")
     if not password:
@@ -256,7 +311,54 @@ def _extract_results(results: dict) -> dict:
     return out
 
 
-def transform_benchmark(benchmark: dict, filepath: str) -> dict:
+def _extract_result_stats(results: dict) -> list:
+    """Results as {request, metric, stat, value} rows (schema version 2).
+
+    The request names are kept as they are in benchmark.json, entries with the stats
+    directly under the name (e.g. locust_users) are metrics of no request.
+    """
+    rows = []
+    for req_name, req_data in results.items():
+        if not isinstance(req_data, dict):
+            continue
+        first_val = next(iter(req_data.values()), None)
+        if isinstance(first_val, dict):
+            metrics = [
+                (req_name, metric_key.replace("locust_requests_", ""), metric_data)
+                for metric_key, metric_data in req_data.items()
+                if isinstance(metric_data, dict)
+            ]
+        else:
+            metrics = [(None, req_name.replace("locust_requests_", ""), req_data)]
+        for request, metric, data in metrics:
+            for stat, value in sorted(_extract_stats(data).items()):
+                rows.append({"request": request, "metric": metric, "stat": stat, "value": value})
+    return rows
+
+
+def _extract_histograms(histograms: dict) -> list:
+    """Latency histograms per request name (scenarios/common/histograms.py).
+
+    Kept as nested documents with a fixed set of fields, the buckets/counts pairs are
+    read back from _source to merge runs or compute any quantile.
+    """
+    if not isinstance(histograms, dict):
+        return []
+    return [
+        {
+            "name": h.get("name"),
+            "type": h.get("type"),
+            "count": safe_int(h.get("count")),
+            "failures": safe_int(h.get("failures")),
+            "buckets": h.get("buckets", []),
+            "counts": h.get("counts", []),
+        }
+        for h in histograms.get("requests", [])
+        if isinstance(h, dict)
+    ]
+
+
+def transform_benchmark(benchmark: dict, filepath: str, schema_version: int = 1) -> dict:
     """Transform a benchmark.json into a flat OpenSearch document."""
     meta = benchmark.get("metadata", {})
     env = meta.get("env", {})
@@ -309,10 +411,15 @@ def transform_benchmark(benchmark: dict, filepath: str) -> dict:
             meta, "cluster", "pods", "rhdh-developer-hub-backstage-backend", "image"
         ),
         "rhdh_release_tag": nested_get(meta, "image", "konflux.additional-tags", default="").split(",")[-1].strip(),
+        "schema_version": schema_version,
     }
 
     doc["measurements"] = _extract_measurements(meas)
-    doc["results"] = _extract_results(results)
+    if schema_version >= 2:
+        doc["result_stats"] = _extract_result_stats(results)
+    else:
+        doc["results"] = _extract_results(results)
+    doc["histograms"] = _extract_histograms(benchmark.get("histograms"))
 
     doc["timings"] = {
         "benchmark_duration": safe_float(nested_get(timings, "benchmark", "duration")),
@@ -340,21 +447,179 @@ def find_benchmark_files(paths: list[str]) -> list[Path]:
     return files
 
 
-def upload_documents(client: OpenSearch, docs: list[dict]) -> None:
-    actions = [
+class Ledger:
+    """Files already uploaded to each index, keyed by their absolute path.
+
+    A file whose mtime and size did not change is skipped without being read, one
+    that was touched is hashed and skipped if its content did not change. Files
+    uploaded with another schema version are uploaded again.
+    """
+
+    def __init__(self, path: Path = None, schema_version: int = 1):
+        self.path = path
+        self.schema_version = schema_version
+        self.files = {}
+        if path and path.is_file():
+            with open(path) as f:
+                data = json.load(f)
+            if data.get("version") == LEDGER_VERSION:
+                self.files = data.get("indexes", {}).get(INDEX_NAME, {})
+            else:
+                log.warning("Ignoring ledger %s of version %s", path, data.get("version"))
+
+    def _entry(self, filepath: Path) -> dict:
+        entry = self.files.get(str(filepath.resolve()))
+        if entry and entry.get("schema_version", 1) == self.schema_version:
+            return entry
+        return None
+
+    def unchanged(self, filepath: Path) -> bool:
+        entry = self._entry(filepath)
+        if not entry:
+            return False
+        stat = filepath.stat()
+        return entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size
+
+    def known_sha256(self, filepath: Path) -> str:
+        entry = self._entry(filepath)
+        return entry["sha256"] if entry else None
+
+    def touch(self, filepath: Path) -> None:
+        # Touched but not modified, remember the new mtime to skip it faster next time
+        self.files[str(filepath.resolve())].update(file_stat(filepath))
+
+    def record(self, filepath: Path, sha256: str, doc_id: str) -> None:
+        self.files[str(filepath.resolve())] = {
+            **file_stat(filepath),
+            "sha256": sha256,
+            "doc_id": doc_id,
+            "schema_version": self.schema_version,
+            "uploaded": datetime.now(timezone.utc).isoformat(),
+        }
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        data = {"version": LEDGER_VERSION, "indexes": {}}
+        if self.path.is_file():
+            with open(self.path) as f:
+                old = json.load(f)
+            if old.get("version") == LEDGER_VERSION:
+                data = old
+        data["indexes"][INDEX_NAME] = self.files
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(data, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+
+
+def file_stat(filepath: Path) -> dict:
+    stat = filepath.stat()
+    return {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+
+def parse_document(filepath: Path, known_sha256: str = None, schema_version: int = 1) -> tuple:
+    """Read, hash and transform a benchmark.json, run in the parser processes.
+
+    Returns (sha256, doc, error), `doc` is None when the content hash is `known_sha256`
+    or on error. Only the transformed document goes back to the main process. Files
+    that cannot be read or transformed (e.g. JSON of an unexpected shape) are errors,
+    not exceptions, so that one bad file does not stop the upload of the others.
+    """
+    try:
+        raw = filepath.read_bytes()
+    except OSError as e:
+        return None, None, f"not readable: {e}"
+    sha256 = hashlib.sha256(raw).hexdigest()
+    if sha256 == known_sha256:
+        return sha256, None, None
+    try:
+        benchmark = json.loads(raw)
+    except ValueError as e:
+        return sha256, None, f"not valid JSON: {e}"
+    del raw
+    try:
+        doc = transform_benchmark(benchmark, str(filepath), schema_version)
+        doc["_id"] = compute_doc_id(benchmark, str(filepath))
+    except (AttributeError, KeyError, IndexError, TypeError, ValueError) as e:
+        return sha256, None, f"not a benchmark document: {type(e).__name__}: {e}"
+    return sha256, doc, None
+
+
+def _parse_in_order(jobs: list[tuple], processes: int):
+    """Yield parse_document() results in the order of the jobs.
+
+    At most 2 * processes files are being parsed or waiting to be consumed, so the
+    memory used does not depend on the number of files.
+    """
+    if processes <= 1:
+        for job in jobs:
+            yield parse_document(*job)
+        return
+    window = 2 * processes
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = deque()
+        for job in jobs:
+            futures.append(pool.submit(parse_document, *job))
+            if len(futures) >= window:
+                yield futures.popleft().result()
+        while futures:
+            yield futures.popleft().result()
+
+
+def load_documents(files: list[Path], ledger: Ledger, pending: dict, summary: dict, processes: int = 1):
+    """Yield the documents of the new or changed files, parsed by `processes` processes.
+
+    The file and content hash of each yielded document are kept in `pending` by
+    document ID until the upload result of the document is known.
+    """
+    jobs = []
+    for filepath in files:
+        if ledger.unchanged(filepath):
+            summary["unchanged"] += 1
+            continue
+        jobs.append((filepath, ledger.known_sha256(filepath), ledger.schema_version))
+
+    for (filepath, *_), (sha256, doc, error) in zip(jobs, _parse_in_order(jobs, processes)):
+        if error:
+            log.error("Failed %s: %s", filepath, error)
+            summary["failed"] += 1
+            continue
+        if doc is None:
+            ledger.touch(filepath)
+            summary["unchanged"] += 1
+            continue
+        log.info("Processed %s", filepath)
+        pending[doc["_id"]] = (filepath, sha256)
+        yield doc
+
+
+def upload_documents(client: OpenSearch, docs, chunk_size: int = 100, max_retries: int = 3):
+    """Stream documents to the bulk API, yielding (doc_id, ok, result) for each of them.
+
+    Requests rejected with 429 are retried with an exponential backoff, other errors
+    are reported per document without stopping the upload.
+    """
+    actions = (
         {
             "_index": INDEX_NAME,
             "_id": doc.pop("_id"),
             "_source": doc,
         }
         for doc in docs
-    ]
-
-    success, errors = helpers.bulk(client, actions, raise_on_error=False)
-    log.info("Indexed %d documents", success)
-    if errors:
-        for err in errors:
-            log.error("Bulk error: %s", json.dumps(err, indent=2))
+    )
+    for ok, item in helpers.streaming_bulk(
+        client,
+        actions,
+        chunk_size=chunk_size,
+        max_retries=max_retries,
+        initial_backoff=2,
+        max_backoff=60,
+        raise_on_error=False,
+        raise_on_exception=False,
+    ):
+        result = next(iter(item.values()))
+        yield result.get("_id"), ok, result
 
 
 def main():
@@ -371,7 +636,39 @@ def main():
         action="store_true",
         help="Parse and print documents without uploading",
     )
+    parser.add_argument(
+        "--ledger",
+        type=Path,
+        help="JSON file recording the uploaded files, unchanged files are skipped",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count(),
+        help="Processes parsing the files (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--schema-version",
+        type=int,
+        choices=SCHEMA_VERSIONS,
+        default=int(os.environ.get("OPENSEARCH_SCHEMA_VERSION", 1)),
+        help="Document layout, 2 keeps the results in a nested array (default: 1)",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=100,
+        help="Documents per bulk request (default: 100)",
+    )
+    parser.add_argument(
+        "--max-retries",
+        type=int,
+        default=3,
+        help="Retries of documents rejected with 429 (default: 3)",
+    )
     args = parser.parse_args()
+    if args.schema_version not in SCHEMA_VERSIONS:
+        parser.error(f"unknown schema version {args.schema_version}")
 
     files = find_benchmark_files(args.paths)
     if not files:
@@ -380,24 +677,42 @@ def main():
 
     log.info("Found %d benchmark file(s)", len(files))
 
-    docs = []
-    for filepath in files:
-        log.info("Processing %s", filepath)
-        with open(filepath) as f:
-            benchmark = json.load(f)
-        doc = transform_benchmark(benchmark, str(filepath))
-        doc["_id"] = compute_doc_id(benchmark, str(filepath))
-        docs.append(doc)
+    ledger = Ledger(args.ledger, args.schema_version)
+    pending = {}
+    summary = {"indexed": 0, "unchanged": 0, "failed": 0}
+    docs = load_documents(files, ledger, pending, summary, args.jobs)
 
     if args.dry_run:
+        count = 0
         for doc in docs:
             print(json.dumps(doc, indent=2, default=str))
-        log.info("Dry run complete — %d document(s) parsed", len(docs))
+            count += 1
+        log.info("Dry run complete — %d document(s) parsed, %d unchanged", count, summary["unchanged"])
         return
 
     client = connect_opensearch()
     ensure_index(client)
-    upload_documents(client, docs)
+    try:
+        for doc_id, ok, result in upload_documents(client, docs, args.chunk_size, args.max_retries):
+            filepath, sha256 = pending.pop(doc_id, (None, None))
+            if ok:
+                summary["indexed"] += 1
+                log.info("Indexed %s as %s (%s)", filepath, doc_id, result.get("result"))
+                if filepath:
+                    ledger.record(filepath, sha256, doc_id)
+            else:
+                summary["failed"] += 1
+                log.error("Failed %s as %s: %s", filepath, doc_id,
+                          json.dumps(result.get("error", result), default=str))
+    finally:
+        ledger.save()
+
+    log.info(
+        "Upload complete — %d indexed, %d unchanged, %d failed",
+        summary["indexed"],
+        summary["unchanged"],
+        summary["failed"],
+    )
 
 
 if __name__ == "__main__":
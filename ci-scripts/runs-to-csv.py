@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""Output a CSV (or Parquet) table of all the benchmark.json files found in a directory.
+
+Every column is declared once in COLUMNS: its name, the JSON path(s) of the value
+in benchmark.json and an optional transform of the value(s). A view is an ordered
+list of column names, the `summary` view is the layout of summary.csv as consumed
+by ci-scripts/scalability/rhdh-perf-chart.py and the spreadsheets, new columns are
+appended to it (or only to a new view) to keep the existing ones in place.
+
+The files are parsed in a process pool and the rows are written as they come, in
+the order of the file paths. The CSV is formatted the way `jq @csv` did: strings
+quoted, numbers bare and missing values empty.
+
+Usage:
+    python runs-to-csv.py <dir> > summary.csv
+    python runs-to-csv.py <dir> --columns Build_ID,Scenario,RPS_Avg
+    python runs-to-csv.py <dir> --format parquet --output summary.parquet   # needs pyarrow
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from decimal import Decimal
+from pathlib import Path
+from typing import Callable, Optional
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(message)s",
+)
+log = logging.getLogger(__name__)
+
+# Values masked with X's (e.g. 1.2XX) are not valid JSON numbers, quote them first
+MASKED_NUMBER_RE = re.compile(
+    r": ([0-9]+\.[0-9]*[X]+[0-9e\+-]*|[0-9]*X+[0-9]*\.[0-9e\+-]*|[0-9]*X+[0-9]*\.[0-9]*X+[0-9e\+-]+)"
+)
+
+# Request names as stored in results by the scenario metrics (regex escaped)
+COMPONENTS_REQUEST = (
+    "/api/catalog/entities/by-query\\\\?limit=20&orderField=metadata\\\\_name%2Casc&filter=kind%3Dcomponent"
+)
+OWNED_BY_GROUP_REQUEST = (
+    "/api/catalog/entities/by-query\\\\?limit=20&orderField=metadata\\\\_name%2Casc"
+    "&filter=kind%3Dapi%2Crelations\\\\_ownedBy%3Duser%3A_+%2Crelations\\\\_ownedBy%3Dgroup%3A_+"
+)
+
+
+@dataclass(frozen=True)
+class Column:
+    name: str
+    # Each path is a dotted string or, for keys with dots, a tuple of keys
+    paths: tuple
+    transform: Optional[Callable] = None
+
+
+def sum_counts(*values):
+    # Missing counts are 0, like `(.a // "0" | tonumber) + (.b // "0" | tonumber)`
+    return sum(float(v) if v not in (None, False) else 0.0 for v in values)
+
+
+def column(name, *paths, transform=None) -> Column:
+    return Column(name, paths, transform)
+
+
+def request(name, request_name, stat) -> Column:
+    return column(name, ("results", request_name, "locust_requests_avg_response_time", stat))
+
+
+COLUMNS = [
+    column("Build_ID", "metadata.env.BUILD_ID"),
+    column("Iteration", "metadata.scalability.iteration"),
+    column("DeployStarted", "measurements.timings.deploy.started"),
+    column("DeployEnded", "measurements.timings.deploy.ended"),
+    column("DeployDuration", "measurements.timings.deploy.duration"),
+    column("PopulateStarted", "measurements.timings.populate.started"),
+    column("PopulateEnded", "measurements.timings.populate.ended"),
+    column("PopulateDuration", "measurements.timings.populate.duration"),
+    column("PopulateCatalogStarted", "measurements.timings.populate_catalog.started"),
+    column("PopulateCatalogEnded", "measurements.timings.populate_catalog.ended"),
+    column("PopulateCatalogDuration", "measurements.timings.populate_catalog.duration"),
+    column("Started", "measurements.timings.benchmark.started"),
+    column("Ended", "measurements.timings.benchmark.ended"),
+    column("Duration", "measurements.timings.benchmark.duration"),
+    column("Scenario", "metadata.scenario.name"),
+    column("ActiveUsers", "results.locust_users.max"),
+    column("USERS", "metadata.env.USERS"),
+    column("SPAWN_RATE", "metadata.env.SPAWN_RATE"),
+    column("WORKERS", "metadata.env.WORKERS"),
+    column("CATALOG_SIZE", "metadata.env.API_COUNT", "metadata.env.COMPONENT_COUNT", transform=sum_counts),
+    column("API_COUNT", "metadata.env.API_COUNT"),
+    column("COMPONENT_COUNT", "metadata.env.COMPONENT_COUNT"),
+    column("BACKSTAGE_USER_COUNT", "metadata.env.BACKSTAGE_USER_COUNT"),
+    column("GROUP_COUNT", "metadata.env.GROUP_COUNT"),
+    column("RBAC_POLICY", "metadata.env.RBAC_POLICY"),
+    column("RBAC_POLICY_SIZE", "metadata.env.RBAC_POLICY_SIZE"),
+    column("RHDH_DEPLOYMENT_REPLICAS", "metadata.env.RHDH_DEPLOYMENT_REPLICAS"),
+    column("RHDH_RESOURCES_CPU_LIMITS", "metadata.env.RHDH_RESOURCES_CPU_LIMITS"),
+    column("RHDH_RESOURCES_MEMORY_LIMITS", "metadata.env.RHDH_RESOURCES_MEMORY_LIMITS"),
+    column("RHDH_DB_REPLICAS", "metadata.env.RHDH_DB_REPLICAS"),
+    column("RHDH_KEYCLOAK_REPLICAS", "metadata.env.RHDH_KEYCLOAK_REPLICAS"),
+    column("RHDH_Pods", "measurements.rhdh-developer-hub.count_ready.mean"),
+    column("RHDH_CPU_Avg", "measurements.rhdh-developer-hub.cpu.mean"),
+    column("RHDH_CPU_Max", "measurements.rhdh-developer-hub.cpu.max"),
+    column("RHDH_Memory_Avg", "measurements.rhdh-developer-hub.memory.mean"),
+    column("RHDH_Memory_Max", "measurements.rhdh-developer-hub.memory.max"),
+    column("RHDH_Heap_Avg", "measurements.nodejs.test.nodejs_heap_size_used_bytes.mean"),
+    column("RHDH_Heap_Max", "measurements.nodejs.test.nodejs_heap_size_used_bytes.max"),
+    column("RHDH_DB_Pods", "measurements.rhdh-postgresql.count_ready.mean"),
+    column("RHDH_DB_CPU_Avg", "measurements.rhdh-postgresql.cpu.mean"),
+    column("RHDH_DB_CPU_Max", "measurements.rhdh-postgresql.cpu.max"),
+    column("RHDH_DB_Memory_Avg", "measurements.rhdh-postgresql.memory.mean"),
+    column("RHDH_DB_Memory_Max", "measurements.rhdh-postgresql.memory.max"),
+    column("RHDH_DB_Populate_Storage_Used", "measurements.cluster.pv_stats.populate.rhdh-postgresql.used_bytes.max"),
+    column("RHDH_DB_Populate_Storage_Available",
+           "measurements.cluster.pv_stats.populate.rhdh-postgresql.available_bytes.min"),
+    column("RHDH_DB_Populate_Storage_Capacity",
+           "measurements.cluster.pv_stats.populate.rhdh-postgresql.capacity_bytes.max"),
+    column("RHDH_DB_Test_Storage_Used", "measurements.cluster.pv_stats.test.rhdh-postgresql.used_bytes.max"),
+    column("RHDH_DB_Test_Storage_Available", "measurements.cluster.pv_stats.test.rhdh-postgresql.available_bytes.min"),
+    column("RHDH_DB_Test_Storage_Capacity", "measurements.cluster.pv_stats.test.rhdh-postgresql.capacity_bytes.max"),
+    column("RPS_Avg", "results.Aggregated.locust_requests_current_rps.mean"),
+    column("RPS_Max", "results.Aggregated.locust_requests_current_rps.max"),
+    column("Failures", "results.Aggregated.locust_requests_num_failures.max"),
+    column("Fail_Ratio_Avg", "results.locust_requests_fail_ratio.mean"),
+    column("Response_Time_Min", "results.Aggregated.locust_requests_avg_response_time.min"),
+    column("Response_Time_Avg", "results.Aggregated.locust_requests_avg_response_time.mean"),
+    column("Response_Time_Perc90", "results.Aggregated.locust_requests_avg_response_time.percentile90"),
+    column("Response_Time_Perc99", "results.Aggregated.locust_requests_avg_response_time.percentile99"),
+    column("Response_Time_Perc999", "results.Aggregated.locust_requests_avg_response_time.percentile999"),
+    column("Response_Time_Max", "results.Aggregated.locust_requests_avg_response_time.max"),
+    column("Response_Size_Avg", "results.Aggregated.locust_requests_avg_content_length.max"),
+    request("Components_Response_Time_Avg", COMPONENTS_REQUEST, "mean"),
+    request("Components_Response_Time_Max", COMPONENTS_REQUEST, "max"),
+    request("ComponentsOwnedByUserGroup_Response_Time_Avg", OWNED_BY_GROUP_REQUEST, "mean"),
+    request("ComponentsOwnedByUserGroup_Response_Time_Max", OWNED_BY_GROUP_REQUEST, "max"),
+    request("Orchestrator_Workflow_Overview_Response_Time_Avg", "/api/orchestrator/v2/workflows/overview", "mean"),
+    request("Orchestrator_Workflow_Overview_Response_Time_Max", "/api/orchestrator/v2/workflows/overview", "max"),
+    request("Orchestrator_Workflow_Execute_Response_Time_Avg", "/api/orchestrator/v2/workflows/_*/execute", "mean"),
+    request("Orchestrator_Workflow_Execute_Response_Time_Max", "/api/orchestrator/v2/workflows/_*/execute", "max"),
+    request("Orchestrator_Workflow_Instance_by_Id_Response_Time_Avg",
+            "/api/orchestrator/v2/workflows/instances/_*", "mean"),
+    request("Orchestrator_Workflow_Instance_by_Id_Response_Time_Max",
+            "/api/orchestrator/v2/workflows/instances/_*", "max"),
+    request("Orchestrator_Workflow_All_Instances_Response_Time_Avg",
+            "/api/orchestrator/v2/workflows/instances", "mean"),
+    request("Orchestrator_Workflow_All_Instances_Response_Time_Max",
+            "/api/orchestrator/v2/workflows/instances", "max"),
+    column("Catalog_Allow_Response_Time_Avg", "results.rbac.catalog.allow_avg.mean"),
+    column("Catalog_Deny_Response_Time_Avg", "results.rbac.catalog.deny_avg.mean"),
+    column("RBAC_Allow_Response_Time_Avg", "results.rbac.rbac.allow_avg.mean"),
+    column("RBAC_Deny_Response_Time_Avg", "results.rbac.rbac.deny_avg.mean"),
+    column("Scaffolder_Allow_Response_Time_Avg", "results.rbac.scaffolder.allow_avg.mean"),
+    column("Scaffolder_Deny_Response_Time_Avg", "results.rbac.scaffolder.deny_avg.mean"),
+    column("Orchestrator_Allow_Response_Time_Avg", "results.rbac.orchestrator.allow_avg.mean"),
+    column("Orchestrator_Deny_Response_Time_Avg", "results.rbac.orchestrator.deny_avg.mean"),
+    column("Auth_Policy_Response_Time_Avg", "results.rbac.auth.policy_check_avg.mean"),
+    column("PAGE_N_COUNT", "metadata.env.PAGE_N_COUNT"),
+    column("CATALOG_TAB_N_COUNT", "metadata.env.CATALOG_TAB_N_COUNT"),
+    column("DynamicPluginsNCount", "metadata.env.PAGE_N_COUNT", "metadata.env.CATALOG_TAB_N_COUNT",
+           transform=sum_counts),
+    request("LoginPageLoadedResponseTimeAvg", "login_page_loaded", "mean"),
+    request("LoginPageLoadedResponseTimeMax", "login_page_loaded", "max"),
+    request("HomePageLoadedResponseTimeAvg", "home_page_loaded", "mean"),
+    request("HomePageLoadedResponseTimeMax", "home_page_loaded", "max"),
+    request("CatalogPageLoadedResponseTimeAvg", "catalog_page_loaded", "mean"),
+    request("CatalogPageLoadedResponseTimeMax", "catalog_page_loaded", "max"),
+    request("ComponentPageLoadedResponseTimeAvg", "component_page_loaded", "mean"),
+    request("ComponentPageLoadedResponseTimeMax", "component_page_loaded", "max"),
+    request("CatalogTabNLoadedResponseTimeAvg", "catalog_tab_n_loaded", "mean"),
+    request("CatalogTabNLoadedResponseTimeMax", "catalog_tab_n_loaded", "max"),
+    request("PageNLoadedResponseTimeAvg", "page_n_loaded", "mean"),
+    request("PageNLoadedResponseTimeMax", "page_n_loaded", "max"),
+    request("E2EDurationAvg", "duration", "mean"),
+    request("E2EDurationMax", "duration", "max"),
+]
+COLUMNS_BY_NAME = {c.name: c for c in COLUMNS}
+
+VIEWS = {
+    # summary.csv as it always was, do not reorder or remove columns
+    "summary": [c.name for c in COLUMNS],
+}
+
+
+def lookup(data, path):
+    # Like jq: a missing key or a null parent gives None, indexing a non-object fails
+    keys = path.split(".") if isinstance(path, str) else path
+    for key in keys:
+        if data is None:
+            return None
+        if not isinstance(data, dict):
+            raise ValueError(f"Cannot index {type(data).__name__} with {key!r}")
+        data = data.get(key)
+    return data
+
+
+def extract(data: dict, columns) -> list:
+    row = []
+    for c in columns:
+        values = [lookup(data, p) for p in c.paths]
+        row.append(c.transform(*values) if c.transform else values[0])
+    return row
+
+
+def load_benchmark(path: Path) -> dict:
+    text = MASKED_NUMBER_RE.sub(r': "\1"', path.read_text())
+    return json.loads(text)
+
+
+def format_number(value) -> str:
+    # Same digits as jq 1.6: shortest repr, plain notation unless very small or large,
+    # NaN is an empty cell and infinities are clamped to the largest double
+    value = float(value)
+    if math.isnan(value):
+        return ""
+    if math.isinf(value):
+        value = math.copysign(sys.float_info.max, value)
+    if value == 0:
+        return "-0" if str(value).startswith("-") else "0"
+    sign, digits, exponent = Decimal(repr(value)).normalize().as_tuple()
+    digits = "".join(map(str, digits))
+    decpt = len(digits) + exponent
+    if decpt <= -4 or decpt > len(digits) + 15:
+        mantissa = digits[0] + ("." + digits[1:] if len(digits) > 1 else "")
+        text = f"{mantissa}e{'+' if decpt > 0 else '-'}{abs(decpt - 1):02d}"
+    elif decpt <= 0:
+        text = "0." + "0" * -decpt + digits
+    elif decpt >= len(digits):
+        text = digits + "0" * (decpt - len(digits))
+    else:
+        text = digits[:decpt] + "." + digits[decpt:]
+    return ("-" if sign else "") + text
+
+
+def format_csv_value(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return format_number(value)
+    if isinstance(value, str):
+        return '"' + value.replace('"', '""') + '"'
+    raise ValueError(f"{type(value).__name__} is not valid in a csv row")
+
+
+def format_csv_row(row) -> str:
+    return ",".join(format_csv_value(v) for v in row) + "\n"
+
+
+def process(job):
+    # The row of one file, already formatted as a CSV line with as_csv, so that a value
+    # that cannot be written fails that file only
+    path, names, as_csv = job
+    columns = [COLUMNS_BY_NAME[n] for n in names]
+    try:
+        row = extract(load_benchmark(Path(path)), columns)
+        return path, format_csv_row(row) if as_csv else row, None
+    except (OSError, ValueError, TypeError) as e:
+        return path, None, str(e)
+
+
+def find_benchmark_files(directory: Path) -> list:
+    return sorted(str(p) for p in directory.rglob("benchmark.json") if p.is_file())
+
+
+def extract_rows(files, names, jobs, as_csv=False):
+    # Yields the rows (or CSV lines) in the order of the files, the failed ones are logged and skipped
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        for path, row, error in pool.map(process, ((f, names, as_csv) for f in files), chunksize=8):
+            if error is not None:
+                log.error("Failed on %s: %s", path, error)
+                continue
+            yield row
+
+
+def write_csv(out, names, lines) -> int:
+    out.write(",".join(names) + "\n")
+    count = 0
+    for line in lines:
+        out.write(line)
+        count += 1
+    return count
+
+
+def write_parquet(path, names, rows) -> int:
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        log.error("Parquet output needs pyarrow: pip install pyarrow")
+        sys.exit(1)
+    # One row per run, small enough to build the table at once
+    rows = list(rows)
+    pq.write_table(pa.Table.from_pylist([dict(zip(names, r)) for r in rows]), path)
+    return len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", nargs="?", type=Path, default=Path("."),
+                        help="directory to search for benchmark.json files")
+    parser.add_argument("--view", choices=sorted(VIEWS), default="summary", help="columns to output")
+    parser.add_argument("--columns", help="comma separated column names, instead of --view")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--output", type=Path, help="output file (default stdout, required for parquet)")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="parser processes")
+    parser.add_argument("--list-columns", action="store_true", help="print the known columns and exit")
+    args = parser.parse_args()
+
+    if args.list_columns:
+        for c in COLUMNS:
+            print(c.name, *[p if isinstance(p, str) else ".".join(p) for p in c.paths])
+        return
+
+    names = args.columns.split(",") if args.columns else VIEWS[args.view]
+    unknown = [n for n in names if n not in COLUMNS_BY_NAME]
+    if unknown:
+        parser.error(f"unknown column(s): {', '.join(unknown)}")
+
+    files = find_benchmark_files(args.directory)
+    rows = extract_rows(files, names, args.jobs, as_csv=args.format == "csv")
+    if args.format == "parquet":
+        if not args.output:
+            parser.error("--output is required for parquet")
+        count = write_parquet(args.output, names, rows)
+    elif args.output:
+        with open(args.output, "w", encoding="utf-8") as out:
+            count = write_csv(out, names, rows)
+    else:
+        count = write_csv(sys.stdout, names, rows)
+    log.info("Wrote %d of %d benchmark.json file(s)", count, len(files))
+
+
+if __name__ == "__main__":
+    main()
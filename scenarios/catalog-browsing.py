@@ -0,0 +1,23 @@
+from locust import events
+from urllib3.exceptions import InsecureRequestWarning
+from common import JourneyUser, add_common_arguments, register_test_users
+import os
+import urllib3
+
+urllib3.disable_warnings(InsecureRequestWarning)
+
+__version__ = "1"
+
+register_test_users()
+
+
+@events.init_command_line_parser.add_listener
+def _(parser):
+    add_common_arguments(parser)
+    # Journey file to run instead of catalog-browsing.journey.yaml
+    parser.add_argument("--journey", type=str, default="")
+
+
+class CatalogBrowsingTest(JourneyUser):
+    # The mvp.py catalog browsing driven by a journey file, edit the YAML to change the traffic
+    journey_file = os.path.join(os.path.dirname(__file__), "catalog-browsing.journey.yaml")
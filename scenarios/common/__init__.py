@@ -0,0 +1,60 @@
+"""Shared building blocks for the RHDH locust scenarios.
+
+The package is shipped to the locust pods as the `locust.common` ConfigMap
+(see `make test`), so it has to stay flat - no sub-packages.
+"""
+
+from . import monitor  # noqa: F401 - registers the load generator monitoring
+from . import timeseries  # noqa: F401 - registers the per second time series recorder
+from .artifacts import publish_artifact
+from .auth import Identity, LoginError, guest_login, keycloak_login, parse_identity
+from .base import BackstageFastSession, BackstageUser, FastBackstageUser
+from .capacity import CapacityShape
+from .histograms import histogram_quantile, merge_histograms
+from .journey import JourneyDefinition, JourneyUser, load_journey_file
+from .options import add_common_arguments, str2bool
+from .pacing import ArrivalRateShape, PacingMixin
+from .pages import PageGroup
+from .pagination import depth_bucket, walk_cursor
+from .responses import debug_response
+from .search import SearchQueryGenerator, ZipfSampler, catalog_size, search_pages
+from .tokens import TokenCache, token_cache
+from .users import UsernamePool, acquire_username, register_test_users, release_username
+from .workflows import WorkflowTracker
+
+__all__ = [
+    "ArrivalRateShape",
+    "BackstageFastSession",
+    "BackstageUser",
+    "CapacityShape",
+    "FastBackstageUser",
+    "Identity",
+    "JourneyDefinition",
+    "JourneyUser",
+    "LoginError",
+    "PacingMixin",
+    "PageGroup",
+    "SearchQueryGenerator",
+    "TokenCache",
+    "UsernamePool",
+    "WorkflowTracker",
+    "ZipfSampler",
+    "acquire_username",
+    "add_common_arguments",
+    "catalog_size",
+    "debug_response",
+    "depth_bucket",
+    "guest_login",
+    "histogram_quantile",
+    "keycloak_login",
+    "load_journey_file",
+    "merge_histograms",
+    "parse_identity",
+    "publish_artifact",
+    "register_test_users",
+    "release_username",
+    "search_pages",
+    "str2bool",
+    "token_cache",
+    "walk_cursor",
+]
@@ -0,0 +1,11 @@
+import json
+
+# Results computed by the locust master that Prometheus cannot scrape are printed to
+# the master log (load-test.log) as single lines
+#   [ARTIFACT] <dotted.key> <json>
+# and merged into benchmark.json under the key by ci-scripts/extract-locust-artifacts.py
+ARTIFACT_MARKER = "[ARTIFACT]"
+
+
+def publish_artifact(key, value):
+    print(f"{ARTIFACT_MARKER} {key} {json.dumps(value, separators=(',', ':'))}", flush=True)
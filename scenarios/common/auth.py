@@ -0,0 +1,141 @@
+from dataclasses import dataclass, field
+from typing import List, Optional
+import base64
+import json
+import re
+import urllib.parse
+
+REALM = "backstage"
+CLIENTID = "backstage"
+
+# Backstage issues 1 hour tokens by default
+DEFAULT_TOKEN_TTL = 3600
+
+GUEST_REFRESH_PATH = '/api/auth/guest/refresh'
+OAUTH2_PROXY_REFRESH_PATH = '/api/auth/oauth2Proxy/refresh'
+
+_form_action_pattern = re.compile(r'action="([^"]*)"')
+
+
+@dataclass
+class Identity:
+    token: str
+    user_ref: Optional[str] = None
+    group_ref: Optional[str] = None
+    ownership_refs: List[str] = field(default_factory=list)
+    expires_in: float = DEFAULT_TOKEN_TTL
+
+    @property
+    def header(self) -> dict:
+        return {'Authorization': 'Bearer ' + self.token}
+
+
+def _token_expires_in(backstage_identity) -> float:
+    # Prefer the TTL reported by Backstage, fall back to the `exp` claim of the JWT
+    expires_in = backstage_identity.get('expiresInSeconds')
+    if expires_in is not None:
+        return float(expires_in)
+    try:
+        payload = backstage_identity['token'].split('.')[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+        return float(claims['exp']) - float(claims.get('iat', claims['exp'] - DEFAULT_TOKEN_TTL))
+    except (IndexError, KeyError, TypeError, ValueError):
+        return DEFAULT_TOKEN_TTL
+
+
+class LoginError(Exception):
+    pass
+
+
+def _identity_of(response, step) -> Identity:
+    # A failed request (e.g. connection refused) has no body, report why instead of a JSON error
+    if not response.content or not 200 <= (response.status_code or 0) < 400:
+        reason = getattr(response, "error", None) or f"HTTP {response.status_code}"
+        raise LoginError(f"{step} failed: {reason}")
+    return parse_identity(json.loads(response.content))
+
+
+def parse_identity(json_dict) -> Identity:
+    # Extracts the token and the user/group ownership refs from a `backstageIdentity` response
+    backstage_identity = json_dict['backstageIdentity']
+    identity_refs = backstage_identity['identity']['ownershipEntityRefs']
+    identity = Identity(token=backstage_identity['token'],
+                        ownership_refs=list(identity_refs),
+                        expires_in=_token_expires_in(backstage_identity))
+    for id_ref in identity_refs:
+        if str(id_ref).startswith("user"):
+            identity.user_ref = id_ref
+            if "guest" in str(id_ref):
+                identity.group_ref = None
+                break
+            continue
+        if str(id_ref).startswith("group"):
+            identity.group_ref = id_ref
+    return identity
+
+
+def _name(name_prefix, name):
+    if name_prefix is None:
+        return None
+    return f"{name_prefix} {name}"
+
+
+def keycloak_login(client, host, keycloak_host, username, password, name_prefix=None) -> Identity:
+    # Walks the OAuth2-proxy/Keycloak redirect chain the same way a browser does
+    keycloak_url = f'https://{keycloak_host}'
+    redirect_url = f'{host}/oauth2/callback'
+    refresh_url = f'{host}{OAUTH2_PROXY_REFRESH_PATH}'
+
+    # Step 1: Get state from refresh URL redirect chain
+    r = client.get(refresh_url, verify=False, allow_redirects=True,
+                   name=_name(name_prefix, "OAuth2 Refresh"))
+    parsed = urllib.parse.urlparse(r.url)
+    qs = urllib.parse.parse_qs(parsed.query)
+    state = qs.get('state', [''])[0]
+
+    # Step 2: Request keycloak auth endpoint to get login form
+    auth_url = f'{keycloak_url}/realms/{REALM}/protocol/openid-connect/auth'
+    auth_params = {
+        'client_id': CLIENTID,
+        'state': state,
+        'redirect_uri': redirect_url,
+        'scope': 'openid email profile',
+        'response_type': 'code'
+    }
+    r = client.get(auth_url, verify=False, params=auth_params, allow_redirects=True,
+                   name=_name(name_prefix, "Keycloak Auth"))
+
+    # Extract action URL from login form
+    authenticate_url = _form_action_pattern.findall(r.text)[0].replace("&amp;", "&")
+
+    # Extract execution and tab_id from action URL
+    parsed_auth = urllib.parse.urlparse(authenticate_url)
+    auth_qs = urllib.parse.parse_qs(parsed_auth.query)
+    execution = auth_qs.get('execution', [''])[0]
+    tab_id = auth_qs.get('tab_id', [''])[0]
+
+    # Step 3: POST credentials to authenticate
+    form_data = {
+        'username': username,
+        'password': password,
+        'credentialId': '',
+        'client_id': CLIENTID,
+        'tab_id': tab_id,
+        'execution': execution
+    }
+    r = client.post(authenticate_url, verify=False, data=form_data, allow_redirects=False,
+                    name=_name(name_prefix, "Keycloak Login"))
+
+    # Get redirect URL with authorization code
+    code_url = r.headers.get('Location', '').replace("&amp;", "&")
+
+    # Step 4: Complete OAuth flow - follow the redirect to get token
+    r = client.get(code_url, verify=False, allow_redirects=True,
+                   name=_name(name_prefix, "Keycloak refresh"))
+    return _identity_of(r, "Keycloak login")
+
+
+def guest_login(client, name_prefix=None) -> Identity:
+    r = client.get(GUEST_REFRESH_PATH, verify=False,
+                   name=_name(name_prefix, "Guest Refresh"))
+    return _identity_of(r, "Guest login")
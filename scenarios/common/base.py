@@ -0,0 +1,166 @@
+import ssl
+from urllib.parse import urlencode
+
+from geventhttpclient.client import HTTPClientPool
+from locust import HttpUser
+from locust.clients import HttpSession
+from locust.contrib.fasthttp import FastHttpSession, FastHttpUser
+
+from .auth import GUEST_REFRESH_PATH, OAUTH2_PROXY_REFRESH_PATH, guest_login, keycloak_login
+from .pages import PageGroup
+from .tokens import token_cache
+from .users import acquire_username, release_username
+
+
+class _BackstageMixin:
+    # Logs in to RHDH on start (Keycloak when --keycloak-host is set, guest otherwise)
+    # and exposes the identity as HEADER, USER_REF and GROUP_REF
+
+    # Prefix used to name the login requests, `None` keeps the locust default (URL)
+    auth_name_prefix = None
+
+    # Fallback username when the master did not hand out any
+    default_username = "t_1"
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.HEADER = ''
+        self.USER_REF = None
+        self.GROUP_REF = None
+        self.USERNAME = None
+        self.PASSWORD = self.environment.parsed_options.keycloak_password
+
+    @property
+    def auth_client(self):
+        # Client running the login flows, they rely on python-requests redirects and cookies
+        return self.client
+
+    def adopt_cookies(self, cookies):
+        self.client.cookies.update(cookies)
+
+    def on_start(self):
+        self.auth_client.verify = False
+        self.USERNAME, self._leased = acquire_username(self.environment, self.default_username)
+        self.login()
+
+    def on_stop(self):
+        if getattr(self, "_leased", False):
+            release_username(self.environment, self.USERNAME)
+        self._leased = False
+        self.USERNAME = None
+
+    def _login(self):
+        opts = self.environment.parsed_options
+        if opts.keycloak_host:
+            return keycloak_login(self.auth_client, self.environment.host, opts.keycloak_host,
+                                  self.USERNAME, self.PASSWORD, self.auth_name_prefix)
+        return guest_login(self.auth_client, self.auth_name_prefix)
+
+    def login(self):
+        opts = self.environment.parsed_options
+        if opts.token_cache or opts.pre_mint_tokens:
+            if opts.keycloak_host:
+                username, refresh_path = self.USERNAME, OAUTH2_PROXY_REFRESH_PATH
+            else:
+                username, refresh_path = "guest", GUEST_REFRESH_PATH
+            cached = token_cache.get(username,
+                                     lambda: (self._login(), self.auth_client.cookies),
+                                     self.environment.host,
+                                     refresh_path,
+                                     self.environment.stats)
+            # The oauth2-proxy session cookie is needed alongside the token
+            self.adopt_cookies(cached.cookies)
+            identity = cached.identity
+            self.HEADER = cached.header
+        else:
+            identity = self._login()
+            self.HEADER = identity.header
+            if self.auth_client is not self.client:
+                self.adopt_cookies(self.auth_client.cookies)
+        self.USER_REF = identity.user_ref
+        self.GROUP_REF = identity.group_ref
+        return identity
+
+    def page(self, name) -> PageGroup:
+        # Groups the requests of a UI page, concurrent with --parallel-pages
+        return PageGroup(self, name, parallel=self.environment.parsed_options.parallel_pages)
+
+
+class BackstageUser(_BackstageMixin, HttpUser):
+    # python-requests based user
+
+    abstract = True
+
+
+class BackstageFastSession(FastHttpSession):
+    # FastHttpSession taking the python-requests arguments used by the scenarios:
+    # `params` are encoded into the URL, so the request gets the same name as with
+    # HttpSession (path and query), and `verify` is ignored as TLS is set per session
+
+    def request(self, method, url, name=None, params=None, verify=None, **kwargs):
+        if params:
+            url = f"{url}{'&' if '?' in url else '?'}{urlencode(params, doseq=True)}"
+        return super().request(method, url, name=name, **kwargs)
+
+
+_ssl_context = None
+_client_pool = None
+
+
+def _shared_ssl_context():
+    # One TLS context for all the connections of the worker instead of one per connection
+    global _ssl_context
+    if _ssl_context is None:
+        # Like insecure=True of the per connection contexts: RHDH routes use self-signed certificates
+        _ssl_context = ssl.create_default_context()
+        _ssl_context.check_hostname = False
+        _ssl_context.verify_mode = ssl.CERT_NONE
+    return _ssl_context
+
+
+def _shared_client_pool(opts, network_timeout, connection_timeout):
+    # Keep-alive connections shared by all the users of the worker (--http-shared-pool-size)
+    global _client_pool
+    if opts.http_shared_pool_size <= 0:
+        return None
+    if _client_pool is None:
+        _client_pool = HTTPClientPool(concurrency=opts.http_shared_pool_size,
+                                      network_timeout=network_timeout,
+                                      connection_timeout=connection_timeout,
+                                      ssl_context_factory=_shared_ssl_context,
+                                      insecure=True)
+    return _client_pool
+
+
+class FastBackstageUser(_BackstageMixin, FastHttpUser):
+    # geventhttpclient based user: the catalog/API traffic goes through the keep-alive
+    # connections of a FastHttpSession while the logins keep using python-requests
+
+    abstract = True
+
+    def __init__(self, parent):
+        # The session built by FastHttpUser is configured through these attributes
+        opts = parent.parsed_options
+        self.network_timeout = opts.http_network_timeout
+        self.connection_timeout = opts.http_network_timeout
+        self.insecure = True
+        self.concurrency = opts.http_pool_size
+        self.client_pool = _shared_client_pool(opts, self.network_timeout, self.connection_timeout)
+        self.ssl_context_factory = _shared_ssl_context
+        self.default_headers = dict(self.default_headers or {})
+        if opts.http_no_keep_alive:
+            self.default_headers["Connection"] = "close"
+        super().__init__(parent)
+        # BackstageFastSession only translates the arguments of the requests, it has no state of its own
+        self.client.__class__ = BackstageFastSession
+        self._auth_session = HttpSession(base_url=self.host,
+                                         request_event=self.environment.events.request,
+                                         user=self)
+
+    @property
+    def auth_client(self):
+        return self._auth_session
+
+    def adopt_cookies(self, cookies):
+        for cookie in cookies:
+            self.client.cookiejar.set_cookie(cookie)
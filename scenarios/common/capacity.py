@@ -0,0 +1,102 @@
+import logging
+
+from locust.stats import calculate_response_time_percentile, diff_response_time_dicts
+
+from .artifacts import publish_artifact
+from .pacing import ArrivalRateShape
+
+# Capacity search (--capacity-search): starts with --users (and --arrival-rate) and adds
+# --step-users users (and --step-rate iterations per second) per step. A step is held for
+# at least --step-hold seconds, then until the p95 and the failure ratio of the Aggregated
+# requests moved by less than --step-tolerance between two --step-window second windows
+# (or for --step-max-hold seconds at most). The search stops at the first step breaching
+# --slo-p95 or --error-budget (or at --run-time), the last step within them is the knee.
+# The steps and the knee go to benchmark.json as results.capacity.
+
+
+def _snapshot(stats):
+    # Only the HTTP requests are in the Aggregated stats, the PAGE, AUTH, WORKFLOW, WORKER, ...
+    # entries of the scenarios are logged outside of it and do not inflate the p95
+    total = stats.total
+    return total.num_requests, total.num_failures, dict(total.response_times)
+
+
+def _window(old, new, duration):
+    requests = new[0] - old[0]
+    failures = new[1] - old[1]
+    response_times = diff_response_time_dicts(new[2], old[2])
+    return {
+        "p95": calculate_response_time_percentile(response_times, requests, 0.95) if requests else 0,
+        "failure_ratio": round(failures / requests, 4) if requests else 0.0,
+        "rps": round(requests / duration, 2) if duration else 0.0,
+    }
+
+
+class CapacityShape(ArrivalRateShape):
+    # Without --capacity-search it runs like ArrivalRateShape
+
+    def __init__(self):
+        super().__init__()
+        self._steps = []
+        self._step = None
+        self._done = False
+
+    def _start_step(self, run_time, users, arrival_rate):
+        self._step = {"users": users, "arrival_rate": arrival_rate, "started": run_time, "windows": []}
+        self._window_started = run_time
+        self._window_snapshot = _snapshot(self.runner.stats)
+        logging.info(f"Capacity search step {len(self._steps) + 1}: {users} users, arrival rate {arrival_rate}/s")
+
+    def _settled(self, opts):
+        windows = self._step["windows"]
+        if len(windows) < 2:
+            return False
+        prev, last = windows[-2], windows[-1]
+        p95_change = abs(last["p95"] - prev["p95"]) / max(prev["p95"], 1)
+        return (p95_change <= opts.step_tolerance
+                and abs(last["failure_ratio"] - prev["failure_ratio"]) <= opts.step_tolerance * opts.error_budget)
+
+    def _breached(self, opts, result):
+        return ((opts.slo_p95 > 0 and result["p95"] > opts.slo_p95)
+                or result["failure_ratio"] > opts.error_budget)
+
+    def _finish(self, reason):
+        self._done = True
+        within = [s for s in self._steps if not s["breached"]]
+        knee = within[-1] if within else None
+        logging.info(f"Capacity search stopped ({reason}), knee: {knee}")
+        publish_artifact("results.capacity", {"stop_reason": reason, "knee": knee, "steps": self._steps})
+
+    def target(self, run_time):
+        opts = self.runner.environment.parsed_options
+        if not opts.capacity_search:
+            return super().target(run_time)
+        if self._done:
+            return None
+        if self._step is None:
+            self._start_step(run_time, opts.num_users, opts.arrival_rate)
+        if opts.run_time and run_time >= opts.run_time:
+            self._finish("run time")
+            return None
+
+        step = self._step
+        if run_time - self._window_started >= opts.step_window:
+            snapshot = _snapshot(self.runner.stats)
+            step["windows"].append(_window(self._window_snapshot, snapshot, run_time - self._window_started))
+            self._window_started, self._window_snapshot = run_time, snapshot
+
+            held = run_time - step["started"]
+            if held >= opts.step_hold and (self._settled(opts) or held >= opts.step_max_hold):
+                # The last window is the settled state of the step
+                result = dict(step["windows"][-1], users=step["users"], arrival_rate=step["arrival_rate"],
+                              duration=round(held), settled=self._settled(opts))
+                result["breached"] = self._breached(opts, result)
+                self._steps.append(result)
+                logging.info(f"Capacity search step {len(self._steps)} result: {result}")
+                if result["breached"]:
+                    self._finish("slo breached")
+                    return None
+                self._start_step(run_time, step["users"] + opts.step_users, step["arrival_rate"] + opts.step_rate)
+                step = self._step
+
+        return step["users"], opts.spawn_rate, step["arrival_rate"]
@@ -0,0 +1,67 @@
+from locust import events
+from locust.runners import WorkerRunner
+
+from .artifacts import publish_artifact
+
+# Latency histograms of every stats entry (--latency-histograms), published by the master
+# at the end of the test and stored in benchmark.json as
+#   histograms: {"scheme": "locust-rounded-ms",
+#                "requests": [{"name", "type", "count", "failures", "buckets", "counts"}, ...]}
+# `buckets` are the response times in ms as locust rounds them (exact below 100ms, two
+# significant digits above, i.e. log buckets within 5%) and `counts` the number of
+# requests in each of them. The buckets are the same in every run, so histograms of
+# several workers or runs are merged by adding the counts of the same bucket.
+HISTOGRAM_SCHEME = "locust-rounded-ms"
+
+
+def histogram(entry) -> dict:
+    buckets = sorted(entry.response_times)
+    return {
+        "name": entry.name,
+        "type": entry.method or "",
+        "count": entry.num_requests,
+        "failures": entry.num_failures,
+        "buckets": [int(b) for b in buckets],
+        "counts": [entry.response_times[b] for b in buckets],
+    }
+
+
+def merge_histograms(histograms) -> dict:
+    # Sums histograms of the same request, e.g. from several scalability iterations
+    merged = {}
+    count = failures = 0
+    for h in histograms:
+        count += h["count"]
+        failures += h["failures"]
+        for bucket, n in zip(h["buckets"], h["counts"]):
+            merged[bucket] = merged.get(bucket, 0) + n
+    buckets = sorted(merged)
+    return {"count": count, "failures": failures, "buckets": buckets, "counts": [merged[b] for b in buckets]}
+
+
+def histogram_quantile(h, q) -> int:
+    # Response time under which a `q` (0.0 - 1.0) fraction of the requests finished
+    total = sum(h["counts"])
+    seen = 0
+    for bucket, n in zip(h["buckets"], h["counts"]):
+        seen += n
+        if seen >= total * q:
+            return bucket
+    return 0
+
+
+@events.quitting.add_listener
+def on_quitting(environment, **_kwargs):
+    # Fired after the workers sent their last stats, the master holds the merged histograms
+    if isinstance(environment.runner, WorkerRunner) or environment.runner is None:
+        return
+    if not getattr(environment.parsed_options, "latency_histograms", False):
+        return
+    stats = environment.runner.stats
+    if stats.total.num_requests == 0:
+        return
+    entries = sorted(stats.entries.values(), key=lambda e: (e.name, e.method or ""))
+    publish_artifact("histograms", {
+        "scheme": HISTOGRAM_SCHEME,
+        "requests": [histogram(e) for e in entries] + [histogram(stats.total)],
+    })
@@ -0,0 +1,304 @@
+from dataclasses import dataclass
+from string import Template
+from typing import Dict, List, Optional, Tuple
+import json
+import os
+import random
+import urllib.parse
+
+import gevent
+from locust import task
+
+from .base import FastBackstageUser
+
+try:
+    import yaml
+except ImportError:  # JSON journeys still work without PyYAML
+    yaml = None
+
+
+# Journey files describe what a user does as data, e.g.:
+#
+#   variables:
+#     guest_group_ref: group:default/group1
+#   journeys:
+#     - name: browse-catalog
+#       weight: 1
+#       think_time: [1, 3]
+#       steps:
+#         - name: Load Catalog
+#           think_time: 0
+#           page: page:load-catalog
+#           requests:
+#             - path: /api/catalog/entity-facets
+#               params: {facet: kind}
+#             - path: /api/catalog/entities/by-query
+#               params: {limit: 20, filter: "kind=component,relations.ownedBy=${user_ref}"}
+#               capture: {next_cursor: pageInfo.nextCursor}
+#             - method: POST
+#               path: /api/catalog/entities/by-refs
+#               json: {entityRefs: ["${group_ref}"]}
+#
+# `${user_ref}` and `${group_ref}` are bound once per user after login, a missing ref (None) drops
+# the filter clauses using it (see _substitute). Values captured from responses are bound when the
+# request runs and requests using them are skipped until captured.
+# Steps with a `page` are timed as a whole (see common/pages.py) and their requests are issued
+# concurrently with --parallel-pages, waiting for the ones in flight when a value is yet to be captured.
+
+
+def load_journey_file(path) -> dict:
+    with open(path) as f:
+        if path.endswith((".yaml", ".yml")):
+            if yaml is None:
+                raise RuntimeError(f"PyYAML is required to load {path}")
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+def _substitute(value, variables):
+    # Recursively replaces ${var} placeholders in strings of nested dicts/lists. What uses a
+    # variable bound to None is dropped, like mvp.py leaves out the filter of a missing ref:
+    # the comma separated clauses of a string, then the string itself (its list item, dict
+    # value or query parameter) when nothing is left
+    if isinstance(value, str):
+        missing = {name for name in _placeholders(value) if name in variables and variables[name] is None}
+        if missing:
+            clauses = [c for c in value.split(",") if not _placeholders(c) & missing]
+            if not clauses:
+                return None
+            value = ",".join(clauses)
+        return Template(value).safe_substitute(variables)
+    if isinstance(value, dict):
+        substituted = ((k, v, _substitute(v, variables)) for k, v in value.items())
+        return {k: s for k, v, s in substituted if s is not None or v is None}
+    if isinstance(value, list):
+        return [s for v, s in ((v, _substitute(v, variables)) for v in value) if s is not None or v is None]
+    if isinstance(value, tuple):
+        return tuple(_substitute(v, variables) for v in value)
+    return value
+
+
+def _placeholders(value) -> set:
+    if isinstance(value, str):
+        return {m.group("named") or m.group("braced")
+                for m in Template.pattern.finditer(value)
+                if m.group("named") or m.group("braced")}
+    if isinstance(value, dict):
+        return set().union(*(_placeholders(v) for v in value.values())) if value else set()
+    if isinstance(value, (list, tuple)):
+        return set().union(*(_placeholders(v) for v in value)) if value else set()
+    return set()
+
+
+def _think_time(value) -> Tuple[float, float]:
+    if isinstance(value, (list, tuple)):
+        return float(value[0]), float(value[1])
+    return float(value or 0), float(value or 0)
+
+
+def _sleep(think_time):
+    low, high = think_time
+    if high > 0:
+        gevent.sleep(random.uniform(low, high))
+
+
+def _extract(data, path):
+    # Follows a dotted path (e.g. pageInfo.nextCursor) in a decoded JSON response
+    for key in path.split("."):
+        if not isinstance(data, dict):
+            return None
+        data = data.get(key)
+    return data
+
+
+@dataclass(frozen=True)
+class PreparedRequest:
+    # A request with the URL (query included) and the body encoded upfront
+    method: str
+    url: str
+    body: Optional[bytes]
+    name: Optional[str]
+    capture: Tuple[Tuple[str, str], ...]
+
+
+@dataclass
+class RequestTemplate:
+    method: str
+    path: str
+    params: List[Tuple[str, object]]
+    json_body: object
+    name: Optional[str]
+    capture: Tuple[Tuple[str, str], ...]
+    placeholders: frozenset
+
+    @classmethod
+    def compile(cls, spec):
+        params = list((spec.get("params") or {}).items())
+        template = cls(
+            method=spec.get("method", "GET").upper(),
+            path=spec["path"],
+            params=params,
+            json_body=spec.get("json"),
+            name=spec.get("name"),
+            capture=tuple((spec.get("capture") or {}).items()),
+            placeholders=frozenset(),
+        )
+        template.placeholders = frozenset(_placeholders([template.path, params, template.json_body, template.name]))
+        return template
+
+    def prepare(self, variables) -> PreparedRequest:
+        params = [(k, v) for k, v in _substitute(self.params, variables) if v is not None]
+        query = urllib.parse.urlencode(params, doseq=True)
+        url = _substitute(self.path, variables)
+        if query:
+            url = f"{url}?{query}"
+        body = None
+        if self.json_body is not None:
+            body = json.dumps(_substitute(self.json_body, variables)).encode()
+        return PreparedRequest(self.method, url, body, _substitute(self.name, variables), self.capture)
+
+
+@dataclass
+class Step:
+    name: str
+    requests: List[RequestTemplate]
+    think_time: Tuple[float, float]
+    page: Optional[str] = None
+
+
+@dataclass
+class Journey:
+    name: str
+    weight: float
+    think_time: Tuple[float, float]
+    steps: List[Step]
+
+
+@dataclass
+class JourneyDefinition:
+    variables: Dict[str, str]
+    journeys: List[Journey]
+
+    @classmethod
+    def compile(cls, data):
+        journeys = []
+        for j in data["journeys"]:
+            steps = [Step(name=s.get("name", ""),
+                          requests=[RequestTemplate.compile(r) for r in s["requests"]],
+                          think_time=_think_time(s.get("think_time")),
+                          page=s.get("page"))
+                     for s in j["steps"]]
+            journeys.append(Journey(name=j.get("name", ""),
+                                    weight=float(j.get("weight", 1)),
+                                    think_time=_think_time(j.get("think_time")),
+                                    steps=steps))
+        return cls(variables=dict(data.get("variables") or {}), journeys=journeys)
+
+    @classmethod
+    def load(cls, path):
+        return cls.compile(load_journey_file(path))
+
+
+class BoundJourney:
+    # The journeys of one user: requests not depending on captured values are prepared once
+
+    def __init__(self, definition, variables):
+        self.definition = definition
+        self.variables = variables
+        self.weights = [j.weight for j in definition.journeys]
+        bound = set(variables)
+        self.steps = [
+            [[t.prepare(variables) if t.placeholders <= bound else t for t in step.requests]
+             for step in journey.steps]
+            for journey in definition.journeys
+        ]
+
+    def pick(self) -> int:
+        return random.choices(range(len(self.weights)), weights=self.weights)[0]
+
+
+class JourneyUser(FastBackstageUser):
+    # Runs the journeys of a journey file (see above), set `journey_file` in the subclass
+
+    abstract = True
+
+    journey_file = None
+
+    _definitions = {}
+
+    @classmethod
+    def definition(cls, path) -> JourneyDefinition:
+        # Compiled once per process and shared by all the users
+        if path not in cls._definitions:
+            cls._definitions[path] = JourneyDefinition.load(path)
+        return cls._definitions[path]
+
+    def journey_path(self):
+        # --journey overrides the default journey file, relative paths are resolved next to it
+        path = getattr(self.environment.parsed_options, "journey", None) or self.journey_file
+        if not os.path.isabs(path):
+            path = os.path.join(os.path.dirname(os.path.abspath(self.journey_file)), path)
+        return path
+
+    def on_start(self):
+        super().on_start()
+        definition = self.definition(self.journey_path())
+        variables = dict(definition.variables)
+        variables["user_ref"] = self.USER_REF
+        group_ref = self.GROUP_REF
+        if self.USER_REF is not None and "guest" in self.USER_REF:
+            group_ref = definition.variables.get("guest_group_ref", group_ref)
+        variables["group_ref"] = group_ref
+        self.journey = BoundJourney(definition, variables)
+        self.json_header = {}
+
+    def send(self, prepared: PreparedRequest, captured):
+        if prepared.body is None:
+            r = self.client.request(prepared.method, prepared.url, name=prepared.name,
+                                    headers=self.HEADER, verify=False)
+        else:
+            # HEADER is refreshed in place by the token cache, follow it
+            if self.json_header.get("Authorization") != self.HEADER["Authorization"]:
+                self.json_header = dict(self.HEADER, **{"Content-Type": "application/json"})
+            r = self.client.request(prepared.method, prepared.url, name=prepared.name,
+                                    headers=self.json_header, data=prepared.body, verify=False)
+        if prepared.capture:
+            try:
+                data = r.json()
+            except (ValueError, TypeError):
+                data = None
+            for var, path in prepared.capture:
+                value = _extract(data, path)
+                if value is None:
+                    captured.pop(var, None)
+                else:
+                    captured[var] = value
+        return r
+
+    def run_step(self, requests, captured, page=None):
+        for request in requests:
+            if isinstance(request, RequestTemplate):
+                if page is not None and not request.placeholders <= set(self.journey.variables) | set(captured):
+                    # The value may be captured by a request still in flight
+                    page.wait()
+                if not request.placeholders <= set(self.journey.variables) | set(captured):
+                    continue
+                request = request.prepare(dict(self.journey.variables, **captured))
+            if page is None:
+                self.send(request, captured)
+            else:
+                page.call(self.send, request, captured)
+
+    @task
+    def execute(self) -> None:
+        index = self.journey.pick()
+        journey = self.journey.definition.journeys[index]
+        captured = {}
+        for step, requests in zip(journey.steps, self.journey.steps[index]):
+            if step.page is None:
+                self.run_step(requests, captured)
+            else:
+                with self.page(step.page) as page:
+                    self.run_step(requests, captured, page)
+            _sleep(step.think_time)
+        _sleep(journey.think_time)
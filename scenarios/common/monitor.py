@@ -0,0 +1,67 @@
+import logging
+import time
+
+import gevent
+import psutil
+from locust import events
+from locust.runners import MasterRunner
+
+# Load generator health, sampled every SAMPLE_INTERVAL seconds on every worker (or the
+# local runner) and logged as locust stats entries of type WORKER named after the worker
+# (its client id, "local" for the local runner) so that the master does not merge them:
+#   worker:cpu:<worker>        response time = CPU usage of the worker process in %
+#   worker:memory-mb:<worker>  response time = resident memory of the worker process in MB
+#   worker:loop-lag:<worker>   response time = how late the sampling greenlet woke up in ms,
+#                              i.e. how long greenlets wait in the run queue of the worker
+# The entries are logged directly (not through the request event) to keep them out of
+# the Aggregated stats of the requests.
+WORKER = "WORKER"
+SAMPLE_INTERVAL = 1.0
+
+# Above this CPU usage the response times include client side queueing
+CPU_WARNING_THRESHOLD = 90.0
+CPU_WARNING_INTERVAL = 60
+
+_sampler = None
+
+
+def _sample(environment):
+    worker = getattr(environment.runner, "client_id", None) or "local"
+    cpu_entry = environment.stats.get(f"worker:cpu:{worker}", WORKER)
+    memory_entry = environment.stats.get(f"worker:memory-mb:{worker}", WORKER)
+    lag_entry = environment.stats.get(f"worker:loop-lag:{worker}", WORKER)
+    process = psutil.Process()
+    process.cpu_percent()
+    last_warning = 0
+    while True:
+        started = time.perf_counter()
+        gevent.sleep(SAMPLE_INTERVAL)
+        lag = max(0.0, time.perf_counter() - started - SAMPLE_INTERVAL) * 1000
+        cpu = process.cpu_percent()
+        rss = process.memory_info().rss
+        cpu_entry.log(cpu, 0)
+        memory_entry.log(rss / 2**20, 0)
+        lag_entry.log(lag, 0)
+        if cpu > CPU_WARNING_THRESHOLD and time.time() - last_warning > CPU_WARNING_INTERVAL:
+            last_warning = time.time()
+            logging.warning(f"Load generator CPU usage at {cpu:.0f}% (loop lag {lag:.0f}ms), "
+                            "response times include client side queueing, add workers")
+
+
+@events.test_start.add_listener
+def on_test_start(environment, **_kwargs):
+    global _sampler
+    if isinstance(environment.runner, MasterRunner):
+        return
+    if not getattr(environment.parsed_options, "worker_monitor", False):
+        return
+    if _sampler is None or _sampler.dead:
+        _sampler = gevent.spawn(_sample, environment)
+
+
+@events.test_stop.add_listener
+def on_test_stop(environment, **_kwargs):
+    global _sampler
+    if _sampler is not None:
+        _sampler.kill(block=False)
+        _sampler = None
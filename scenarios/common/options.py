@@ -0,0 +1,62 @@
+import argparse
+
+
+def str2bool(value) -> bool:
+    # type=bool takes any non empty string as True, `--token-cache false` included
+    if isinstance(value, bool):
+        return value
+    if value.lower() in ("true", "yes", "on", "1"):
+        return True
+    if value.lower() in ("false", "no", "off", "0"):
+        return False
+    raise argparse.ArgumentTypeError(f"expected true or false, got {value!r}")
+
+
+def add_common_arguments(parser, debug=False):
+    # Options understood by every scenario; `make test` passes some of them unconditionally
+    parser.add_argument("--page-n-count", type=int, default=0)
+    parser.add_argument("--catalog-tab-n-count", type=int, default=0)
+    parser.add_argument("--keycloak-host", type=str, default="")
+    parser.add_argument("--keycloak-password", is_secret=True, default="")
+    parser.add_argument("--debug", type=bool, default=debug)
+    # Reuse (and refresh in background) the Backstage token of a username within a worker
+    parser.add_argument("--token-cache", type=str2bool, default=True)
+    # Let the master log all the users in before spawning and ship the tokens to the workers
+    parser.add_argument("--pre-mint-tokens", type=bool, default=False)
+    parser.add_argument("--pre-mint-concurrency", type=int, default=20)
+    # Issue the requests of a page concurrently like the frontend does (see common/pages.py)
+    parser.add_argument("--parallel-pages", type=bool, default=False)
+    # Pages of the catalog walked through by-query cursors, -1 walks the whole catalog
+    parser.add_argument("--cursor-walk-pages", type=int, default=1)
+    # Report time to first byte and wire size of every response
+    parser.add_argument("--response-accounting", type=bool, default=False)
+    # With --response-accounting, also parse the JSON bodies to count their items
+    parser.add_argument("--count-entities", type=bool, default=False)
+    # With --debug, write this fraction of the response bodies to the directory instead of printing them
+    parser.add_argument("--sample-bodies-dir", type=str, default="")
+    parser.add_argument("--sample-bodies-rate", type=float, default=0.01)
+    # Connections of the geventhttpclient users (FastBackstageUser): per user, or shared by
+    # all the users of a worker when --http-shared-pool-size is set
+    parser.add_argument("--http-pool-size", type=int, default=10)
+    parser.add_argument("--http-shared-pool-size", type=int, default=0)
+    parser.add_argument("--http-no-keep-alive", type=bool, default=False)
+    parser.add_argument("--http-network-timeout", type=float, default=60.0)
+    # Sample CPU, loop lag and memory of the load generators (see common/monitor.py)
+    parser.add_argument("--worker-monitor", type=str2bool, default=True)
+    # Open loop: iterations per second over all the users, 0 keeps the users closed loop (see common/pacing.py)
+    parser.add_argument("--arrival-rate", type=float, default=0.0)
+    parser.add_argument("--arrival-distribution", choices=["constant", "poisson"], default="constant")
+    # Add users and/or arrival rate in steps until the SLO breaks (see common/capacity.py)
+    parser.add_argument("--capacity-search", type=bool, default=False)
+    parser.add_argument("--step-users", type=int, default=0)
+    parser.add_argument("--step-rate", type=float, default=0.0)
+    parser.add_argument("--step-hold", type=int, default=60)
+    parser.add_argument("--step-max-hold", type=int, default=300)
+    parser.add_argument("--step-window", type=int, default=15)
+    parser.add_argument("--step-tolerance", type=float, default=0.1)
+    parser.add_argument("--slo-p95", type=float, default=0.0)
+    parser.add_argument("--error-budget", type=float, default=0.01)
+    # Publish the latency histogram of every request name to benchmark.json (see common/histograms.py)
+    parser.add_argument("--latency-histograms", type=str2bool, default=True)
+    # Record per second counts and latency histograms of every request name (see common/timeseries.py)
+    parser.add_argument("--timeseries", type=bool, default=False)
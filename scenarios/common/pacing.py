@@ -0,0 +1,110 @@
+import random
+import time
+
+from locust import LoadTestShape, events
+from locust.runners import MasterRunner
+
+# Open loop pacing (--arrival-rate): the users start their iterations on a schedule of
+# --arrival-rate iterations per second over all the users, constant or Poisson
+# (--arrival-distribution), whatever the response times are. A slow RHDH then keeps
+# receiving the same load and the users fall behind schedule instead of slowing down.
+# Logged as locust stats entries of type PACING:
+#   pacing:iteration  response time = time from the scheduled start of an iteration to
+#                     its end, i.e. the latency free of coordinated omission
+#   pacing:lag        response time = how late the iteration started compared to its
+#                     schedule, 0 while the users keep up
+# The entries are logged directly (not through the request event) to keep them out of
+# the Aggregated stats of the requests.
+PACING = "PACING"
+
+DISTRIBUTIONS = ("constant", "poisson")
+
+# Arrival rate and total number of users set by the running shape, None until the
+# master sent one and the users follow --arrival-rate and --users
+_target = None
+
+
+def per_user_rate(environment) -> float:
+    opts = environment.parsed_options
+    rate, users = _target or (getattr(opts, "arrival_rate", 0), getattr(opts, "num_users", 0))
+    if not rate or not users:
+        return 0.0
+    return rate / users
+
+
+def next_interval(rate, distribution="constant") -> float:
+    if distribution == "poisson":
+        return random.expovariate(rate)
+    return 1 / rate
+
+
+def set_arrival_target(environment, rate, users):
+    # Sends the arrival rate the users pace to, from the shape on the master (or locally)
+    global _target
+    _target = (rate, users)
+    environment.runner.send_message("pacing_target", [rate, users])
+
+
+def on_pacing_target(environment, msg, **kwargs):
+    # Fired on the worker when the shape on the master changes the arrival rate
+    global _target
+    _target = tuple(msg.data)
+
+
+class PacingMixin:
+    # Paces the iterations of a user (one task execution) to its share of --arrival-rate,
+    # closed loop (no wait) as before when the rate is 0. Mix in before the User class.
+
+    def on_start(self):
+        super().on_start()
+        # The first iteration is due as soon as the user is logged in
+        self._scheduled = time.perf_counter()
+
+    def wait_time(self):
+        rate = per_user_rate(self.environment)
+        now = time.perf_counter()
+        scheduled = getattr(self, "_scheduled", None)
+        if rate <= 0 or scheduled is None:
+            self._scheduled = now
+            return 0
+        stats = self.environment.stats
+        stats.get("pacing:iteration", PACING).log((now - scheduled) * 1000, 0)
+        self._scheduled = scheduled + next_interval(rate, self.environment.parsed_options.arrival_distribution)
+        delay = self._scheduled - now
+        stats.get("pacing:lag", PACING).log(max(0.0, -delay) * 1000, 0)
+        return max(0.0, delay)
+
+
+class ArrivalRateShape(LoadTestShape):
+    # Runs --users users spawned at --spawn-rate for --run-time like a test without a
+    # shape and tells the users the arrival rate to pace to. Subclasses override
+    # `target()` to change the users or the arrival rate during the test.
+
+    use_common_options = True
+
+    def __init__(self):
+        super().__init__()
+        self._sent = None
+
+    def target(self, run_time):
+        # (users, spawn rate, arrival rate) at `run_time` seconds into the test, None stops it
+        opts = self.runner.environment.parsed_options
+        if opts.run_time and run_time >= opts.run_time:
+            return None
+        return opts.num_users, opts.spawn_rate, getattr(opts, "arrival_rate", 0)
+
+    def tick(self):
+        target = self.target(self.get_run_time())
+        if target is None:
+            return None
+        users, spawn_rate, arrival_rate = target
+        if arrival_rate and (arrival_rate, users) != self._sent:
+            self._sent = (arrival_rate, users)
+            set_arrival_target(self.runner.environment, arrival_rate, users)
+        return users, spawn_rate
+
+
+@events.init.add_listener
+def on_locust_init(environment, **_kwargs):
+    if environment.runner is not None and not isinstance(environment.runner, MasterRunner):
+        environment.runner.register_message("pacing_target", on_pacing_target)
@@ -0,0 +1,93 @@
+import time
+
+import gevent
+from gevent.pool import Pool
+
+# Browsers open at most this many HTTP/1.1 connections per host
+MAX_CONCURRENCY = 6
+
+# Stats entries type of the pages (outside of the Aggregated stats)
+PAGE = "PAGE"
+
+
+class PageGroup:
+    # The requests of one page of the UI, issued on greenlets of the calling user the way
+    # the frontend issues them, e.g.:
+    #
+    #   with self.page("page:load-catalog") as page:
+    #       page.call(self.entitiy_facets, "kind")
+    #       page.call(self.entitiy_facets, "spec.lifecycle")
+    #       page.wait()  # the next calls depend on the ones above
+    #       page.call(self.entities_by_refs, [group_ref])
+    #
+    # The requests keep reporting their own timings, the whole page is logged as a stats
+    # entry of type PAGE named after the page, failing when any of its requests failed.
+    # With parallel=False the calls run one after another, as the scenarios always did.
+    # A group returned by a call of another group counts as a failed call when it failed.
+
+    def __init__(self, user, name, parallel=True, concurrency=MAX_CONCURRENCY):
+        self.user = user
+        self.name = name
+        self.parallel = parallel
+        self._pool = Pool(concurrency) if parallel else None
+        self._greenlets = []
+        self.results = []
+        self._started = None
+        self.failure = None
+
+    def call(self, fn, *args, **kwargs) -> None:
+        if self.parallel:
+            self._greenlets.append(self._pool.spawn(fn, *args, **kwargs))
+        else:
+            self.results.append(fn(*args, **kwargs))
+
+    def wait(self) -> list:
+        # Waits for the calls in flight, returns the results of all the calls so far
+        if self._greenlets:
+            greenlets, self._greenlets = self._greenlets, []
+            gevent.joinall(greenlets, raise_error=True)
+            self.results.extend(g.value for g in greenlets)
+        return self.results
+
+    @property
+    def ok(self) -> bool:
+        return self.failure is None
+
+    def _failed(self):
+        # Calls returning a response (e.g. self.client.get) or a group tell whether they failed
+        return sum(1 for r in self.results if getattr(r, "ok", True) is False)
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            try:
+                self.wait()
+            except Exception as e:
+                exc_type, exc_value = type(e), e
+                raise
+            finally:
+                self._fire(exc_value)
+        else:
+            if self._pool is not None:
+                self._pool.kill()
+            # The user being stopped is not a page failure
+            if issubclass(exc_type, Exception):
+                self._fire(exc_value)
+        return False
+
+    def _fire(self, exception):
+        # Logged directly (not through the request event) to keep the pages out of the
+        # Aggregated stats, their requests are already there
+        entry = self.user.environment.stats.get(self.name, PAGE)
+        failed = self._failed()
+        if exception is None and failed > 0:
+            exception = Exception(f"{failed} of {len(self.results)} page requests failed")
+        if exception is not None:
+            self.failure = exception
+            entry.log_error(exception)
+            return
+        entry.log((time.perf_counter() - self._started) * 1000,
+                  sum(len(getattr(r, "content", None) or b"") for r in self.results))
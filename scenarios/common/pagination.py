@@ -0,0 +1,43 @@
+BY_QUERY_PATH = "/api/catalog/entities/by-query"
+
+# Deepest bucket reported on its own, deeper pages share the last one
+MAX_DEPTH_BUCKET = 1024
+
+
+def depth_bucket(depth) -> str:
+    # Power of two buckets (1, 2, 3-4, 5-8, ...) keep the request names bounded
+    # when the whole catalog is walked
+    if depth <= 2:
+        return str(depth)
+    if depth > MAX_DEPTH_BUCKET:
+        return f"{MAX_DEPTH_BUCKET + 1}+"
+    high = 1 << (depth - 1).bit_length()
+    return f"{high // 2 + 1}-{high}"
+
+
+def next_cursor(response):
+    try:
+        page_info = response.json().get("pageInfo") or {}
+    except (ValueError, TypeError, AttributeError):
+        return None
+    return page_info.get("nextCursor")
+
+
+def walk_cursor(user, response, pages=1, limit=20) -> int:
+    # Follows `pageInfo.nextCursor` of a by-query response for up to `pages` pages
+    # (the whole result set when negative), returns the number of pages loaded.
+    # A single page keeps the locust default name (the URL) the metrics already use,
+    # deeper walks name the requests after the depth of the page (e.g. cursor-depth:5-8)
+    # so that the per-name percentiles show whether the late pages degrade.
+    depth = 0
+    while pages < 0 or depth < pages:
+        cursor = next_cursor(response)
+        if not cursor:
+            break
+        depth += 1
+        response = user.client.get(BY_QUERY_PATH,
+                                   verify=False,
+                                   headers=user.HEADER,
+                                   params={"limit": limit, "orderField": "metadata.name,asc", "cursor": cursor},
+                                   name=None if pages == 1 else f"cursor-depth:{depth_bucket(depth)}")
+    return depth
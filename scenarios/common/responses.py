@@ -0,0 +1,110 @@
+import logging
+import os
+import random
+import re
+import uuid
+
+from locust import events
+
+# Stats entries of the response accounting (--response-accounting) next to the requests
+# themselves, under the same request names but outside of the Aggregated stats:
+#   TTFB      response time = time to first byte (headers received),
+#             content length = bytes received on the wire (compressed)
+#   ENTITIES  response time = number of items in the JSON response,
+#             content length = decompressed body size,
+#             only with --count-entities as it parses every JSON body
+TTFB = "TTFB"
+ENTITIES = "ENTITIES"
+
+_accounting = None
+_count_entities = False
+
+
+def wire_size(response) -> int:
+    # urllib3 counts the bytes pulled from the socket, before decompression,
+    # geventhttpclient responses only tell the Content-Length
+    try:
+        return int(response.raw.tell())
+    except (AttributeError, TypeError, ValueError):
+        pass
+    try:
+        return int(response.headers.get("content-length"))
+    except (AttributeError, TypeError, ValueError):
+        return len(response.content or b"")
+
+
+def entity_count(response):
+    if "json" not in response.headers.get("content-type", ""):
+        return None
+    try:
+        data = response.json()
+    except (ValueError, TypeError):
+        return None
+    if isinstance(data, list):
+        return len(data)
+    if isinstance(data, dict) and isinstance(data.get("items"), list):
+        return len(data["items"])
+    return None
+
+
+def sample_body(environment, response, label):
+    # Writes the body of roughly --sample-bodies-rate of the responses to --sample-bodies-dir,
+    # returns its path or "empty" for an empty body (reported, not written). The body has been
+    # read already, streaming it again gives nothing with geventhttpclient
+    opts = environment.parsed_options
+    if not opts.sample_bodies_dir or random.random() >= opts.sample_bodies_rate:
+        return None
+    body = response.content or b""
+    if not body:
+        return "empty"
+    filename = re.sub(r"[^A-Za-z0-9_.-]", "_", label)
+    path = os.path.join(opts.sample_bodies_dir, f"{filename}-{uuid.uuid4().hex}.body")
+    try:
+        os.makedirs(opts.sample_bodies_dir, exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(body)
+    except OSError as e:
+        logging.warning(f"Failed to sample the response body to {path}: {e}")
+        return None
+    return path
+
+
+def debug_response(environment, response, label, **fields):
+    # --debug summary of a response, the body goes to disk (when sampled) instead of stdout
+    if not environment.parsed_options.debug:
+        return
+    fields["status"] = response.status_code
+    debug_output = f"[DEBUG][{label}] " + ", ".join(f"{k}={v}" for k, v in fields.items())
+    debug_output += f", response_size={len(response.content or b'')}"
+    debug_output += f", wire_size={wire_size(response)}"
+    path = sample_body(environment, response, label)
+    if path is not None:
+        debug_output += f", body={path}"
+    print(debug_output)
+
+
+@events.init.add_listener
+def on_locust_init(environment, **_kwargs):
+    global _accounting, _count_entities
+    opts = environment.parsed_options
+    if getattr(opts, "response_accounting", False):
+        _accounting = environment.stats
+        _count_entities = bool(getattr(opts, "count_entities", False))
+
+
+@events.request.add_listener
+def on_request(name, response=None, exception=None, **_kwargs):
+    if _accounting is None or exception is not None:
+        return
+    # Only real HTTP responses, not the timings logged by the scenarios
+    if response is None or getattr(response, "headers", None) is None:
+        return
+    # Both python-requests and geventhttpclient responses tell when the headers arrived
+    elapsed = getattr(response, "elapsed", None)
+    if elapsed is not None:
+        _accounting.get(name, TTFB).log(elapsed.total_seconds() * 1000, wire_size(response))
+    if not _count_entities:
+        return
+    count = entity_count(response)
+    if count is not None:
+        _accounting.get(name, ENTITIES).log(count, len(response.content or b""))
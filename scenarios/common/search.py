@@ -0,0 +1,140 @@
+import bisect
+import itertools
+import logging
+import random
+
+from .pagination import BY_QUERY_PATH, depth_bucket
+
+SEARCH_PATH = "/api/search/query"
+
+# Entities created by ci-scripts/rhdh-setup/create_resource.sh from
+# template/component/{component,api}.template, owned by the groups round robin
+COMPONENT_NAME = "playback-sdk-{}"
+API_NAME = "wayback-archive-{}"
+GROUP_NAME = "g{}"
+LIFECYCLES = {"Component": "experimental", "API": "production"}
+# Words of the names and descriptions of the templates, the most searched first
+WORDS = ["playback", "sdk", "wayback", "archive", "audio", "video", "api", "machine", "copy"]
+
+# Kinds of generated queries and how often they are picked
+QUERY_WEIGHTS = {
+    "name": 5,       # exact entity name
+    "word": 3,       # a word of the names/descriptions, lots of results
+    "owner": 2,      # entities of a group, filtered by kind
+    "lifecycle": 1,  # all the entities of a kind and lifecycle
+    "not-found": 1,  # a term matching nothing
+}
+
+# Fixed seed so that every worker agrees on which entities are the popular ones
+POPULARITY_SEED = 42
+
+
+class ZipfSampler:
+    # Draws ranks 1..n, rank k with a probability proportional to 1 / k^exponent
+
+    def __init__(self, n, exponent=1.1, rng=random):
+        self.rng = rng
+        self._cum_weights = list(itertools.accumulate(1 / k ** exponent for k in range(1, n + 1)))
+
+    def sample(self) -> int:
+        x = self.rng.random() * self._cum_weights[-1]
+        return bisect.bisect_left(self._cum_weights, x) + 1
+
+
+class _Popularity:
+    # Zipf over the entity indexes 1..n, in an order shuffled once (the same on every worker)
+    # so that the popular entities are spread over the catalog and the groups
+
+    def __init__(self, n, exponent, rng):
+        self._order = list(range(1, n + 1))
+        random.Random(POPULARITY_SEED).shuffle(self._order)
+        self._ranks = ZipfSampler(n, exponent, rng)
+
+    def sample(self) -> int:
+        return self._order[self._ranks.sample() - 1]
+
+
+class SearchQueryGenerator:
+    # Builds /api/search/query parameters out of the names of the populated catalog with
+    # a Zipf popularity, so that the search backend sees realistic cache hit rates.
+    # `next()` returns the query kind (used to name the requests) and the parameters.
+
+    def __init__(self, components, apis, groups, exponent=1.1, rng=random):
+        self.rng = rng
+        self.groups = max(groups, 1)
+        self._kinds = [(kind, n) for kind, n in (("Component", components), ("API", apis)) if n > 0]
+        self._popularity = {kind: _Popularity(n, exponent, rng) for kind, n in self._kinds}
+        self._groups = _Popularity(self.groups, exponent, rng)
+        self._words = ZipfSampler(len(WORDS), exponent, rng)
+        self._query_kinds = list(QUERY_WEIGHTS)
+        self._query_weights = list(QUERY_WEIGHTS.values())
+
+    def _kind(self):
+        # Components and APIs in proportion of their numbers
+        return self.rng.choices([kind for kind, _ in self._kinds], [n for _, n in self._kinds])[0]
+
+    def _entity(self):
+        kind = self._kind()
+        index = self._popularity[kind].sample()
+        return kind, (COMPONENT_NAME if kind == "Component" else API_NAME).format(index)
+
+    def next(self):
+        query = self.rng.choices(self._query_kinds, self._query_weights)[0]
+        if not self._kinds and query in ("name", "owner", "lifecycle"):
+            query = "word"
+        params = {"types[0]": "software-catalog"}
+        if query == "name":
+            _, params["term"] = self._entity()
+        elif query == "word":
+            params["term"] = WORDS[self._words.sample() - 1]
+        elif query == "owner":
+            params["filters[kind]"] = self._kind()
+            params["filters[owner]"] = GROUP_NAME.format(self._groups.sample())
+        elif query == "lifecycle":
+            kind = self._kind()
+            params["filters[kind]"] = kind
+            params["filters[lifecycle][0]"] = LIFECYCLES[kind]
+        else:
+            params["term"] = f"n/a-{self.rng.getrandbits(32):08x}"
+        return query, params
+
+
+def next_page_cursor(response):
+    try:
+        return response.json().get("nextPageCursor")
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+
+def search_pages(user, query, params, pages=1, headers=None):
+    # Runs a generated query and follows `nextPageCursor` for up to `pages` pages, the
+    # requests are named after the query kind and the page depth (e.g. search:word:page-3-4)
+    # to keep the number of request names bounded
+    response = user.client.get(SEARCH_PATH, verify=False, headers=headers, params=params,
+                               name=f"search:{query}")
+    depth = 1
+    while depth < pages:
+        cursor = next_page_cursor(response)
+        if not cursor:
+            break
+        depth += 1
+        response = user.client.get(SEARCH_PATH, verify=False, headers=headers,
+                                   params=dict(params, pageCursor=cursor),
+                                   name=f"search:{query}:page-{depth_bucket(depth)}")
+    return depth
+
+
+def catalog_size(user, kind, headers=None) -> int:
+    # Number of entities of a kind in the catalog, 0 (with a warning) when it cannot be told.
+    # Asked with the headers of the user (its HEADER by default) like its other requests
+    if headers is None:
+        headers = getattr(user, "HEADER", None)
+    response = user.client.get(BY_QUERY_PATH, verify=False, headers=headers,
+                               params={"filter": f"kind={kind.lower()}", "limit": 0},
+                               name="search:catalog-size")
+    try:
+        return int(response.json()["totalItems"])
+    except (ValueError, TypeError, KeyError, AttributeError):
+        logging.warning(f"Failed to tell the number of {kind} entities in the catalog "
+                        f"(status {getattr(response, 'status_code', None)}), no {kind} queries are generated")
+        return 0
@@ -0,0 +1,154 @@
+from array import array
+import base64
+import json
+import sys
+import time
+import zlib
+
+import gevent
+from locust import events
+from locust.runners import WorkerRunner
+
+# Per second time series of the requests (--timeseries): for every second and request
+# name the count, failures, sum and max of the response times and a log2 histogram
+# (bucket b holds the response times of b bits, i.e. 2^(b-1) <= ms < 2^b). The workers
+# record them from the request event and ship them to the master along with the stats,
+# the master prints them every FLUSH_INTERVAL seconds to its log as
+#   [TIMESERIES] <base64 of a zlib compressed chunk>
+# and ci-scripts/extract-locust-artifacts.py appends the chunks to timeseries.bin.
+# A chunk is a JSON header line {"version", "byteorder", "names", "columns": [[name, typecode, length], ...]}
+# followed by the raw little endian arrays of the columns in the header order:
+#   second, name, count, failures, sum_ms, max_ms    one row per second and request name
+#   row, bucket, bucket_count                        one row per non empty histogram bucket
+TIMESERIES_MARKER = "[TIMESERIES]"
+TIMESERIES_VERSION = 1
+
+FLUSH_INTERVAL = 10
+# Seconds the master waits for the reports of the workers before printing a second
+LATE_MARGIN = 10
+
+# {second: {(request type, name): [count, failures, sum_ms, max_ms, {bucket: count}]}}
+_series = {}
+_flusher = None
+_enabled = False
+
+
+def _record(second, key, count, failures, sum_ms, max_ms, buckets):
+    row = _series.setdefault(second, {}).get(key)
+    if row is None:
+        _series[second][key] = [count, failures, sum_ms, max_ms, dict(buckets)]
+        return
+    row[0] += count
+    row[1] += failures
+    row[2] += sum_ms
+    row[3] = max(row[3], max_ms)
+    for bucket, n in buckets.items():
+        row[4][bucket] = row[4].get(bucket, 0) + n
+
+
+def encode_chunk(seconds) -> str:
+    names = sorted({key for second in seconds for key in _series[second]})
+    name_ids = {key: i for i, key in enumerate(names)}
+    columns = {
+        "second": array("I"), "name": array("H"), "count": array("I"), "failures": array("I"),
+        "sum_ms": array("d"), "max_ms": array("f"),
+        "row": array("I"), "bucket": array("B"), "bucket_count": array("I"),
+    }
+    for second in seconds:
+        for key, (count, failures, sum_ms, max_ms, buckets) in sorted(_series[second].items()):
+            row = len(columns["second"])
+            columns["second"].append(second)
+            columns["name"].append(name_ids[key])
+            columns["count"].append(count)
+            columns["failures"].append(failures)
+            columns["sum_ms"].append(sum_ms)
+            columns["max_ms"].append(max_ms)
+            for bucket, n in sorted(buckets.items()):
+                columns["row"].append(row)
+                columns["bucket"].append(bucket)
+                columns["bucket_count"].append(n)
+    header = {
+        "version": TIMESERIES_VERSION,
+        "byteorder": "little",
+        "names": [list(key) for key in names],
+        "columns": [[name, column.typecode, len(column)] for name, column in columns.items()],
+    }
+    payload = json.dumps(header, separators=(",", ":")).encode() + b"\n"
+    for column in columns.values():
+        if sys.byteorder != "little":
+            column.byteswap()
+        payload += column.tobytes()
+    return base64.b64encode(zlib.compress(payload)).decode()
+
+
+def _flush(before=None):
+    # Prints the seconds older than `before` (all of them when None)
+    seconds = sorted(s for s in _series if before is None or s < before)
+    if not seconds:
+        return
+    chunk = encode_chunk(seconds)
+    for second in seconds:
+        del _series[second]
+    print(f"{TIMESERIES_MARKER} {chunk}", flush=True)
+
+
+def _flush_periodically():
+    while True:
+        gevent.sleep(FLUSH_INTERVAL)
+        _flush(int(time.time()) - LATE_MARGIN)
+
+
+@events.init.add_listener
+def on_locust_init(environment, **_kwargs):
+    global _enabled
+    _enabled = bool(getattr(environment.parsed_options, "timeseries", False))
+
+
+@events.request.add_listener
+def on_request(request_type, name, response_time, exception=None, **_kwargs):
+    if not _enabled or response_time is None:
+        return
+    ms = int(response_time)
+    _record(int(time.time()), (request_type, name), 1, 0 if exception is None else 1,
+            response_time, response_time, {ms.bit_length(): 1})
+
+
+@events.report_to_master.add_listener
+def on_report_to_master(client_id, data, **_kwargs):
+    # Ships everything recorded since the last report, the master adds up partial seconds
+    if not _enabled:
+        return
+    seconds = list(_series)
+    data["timeseries"] = [
+        [second, list(key), count, failures, sum_ms, max_ms, list(buckets.items())]
+        for second in seconds
+        for key, (count, failures, sum_ms, max_ms, buckets) in _series.pop(second).items()
+    ]
+
+
+@events.worker_report.add_listener
+def on_worker_report(client_id, data, **_kwargs):
+    for second, key, count, failures, sum_ms, max_ms, buckets in data.get("timeseries", []):
+        _record(second, tuple(key), count, failures, sum_ms, max_ms, dict(buckets))
+
+
+@events.test_start.add_listener
+def on_test_start(environment, **_kwargs):
+    global _enabled, _flusher
+    # The workers got the options of the master by now
+    _enabled = bool(getattr(environment.parsed_options, "timeseries", False))
+    if not _enabled or isinstance(environment.runner, WorkerRunner):
+        return
+    if _flusher is None or _flusher.dead:
+        _flusher = gevent.spawn(_flush_periodically)
+
+
+@events.quitting.add_listener
+def on_quitting(environment, **_kwargs):
+    global _flusher
+    if not _enabled or isinstance(environment.runner, WorkerRunner):
+        return
+    if _flusher is not None:
+        _flusher.kill(block=False)
+        _flusher = None
+    _flush()
@@ -0,0 +1,199 @@
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Optional
+import json
+import logging
+import time
+
+import gevent
+from gevent.lock import Semaphore
+from gevent.pool import Pool
+from locust import events
+from locust.clients import HttpSession
+from locust.event import EventHook
+from requests.cookies import RequestsCookieJar
+
+from .auth import Identity, guest_login, keycloak_login, parse_identity
+
+# Refresh the token this many seconds before it expires
+REFRESH_MARGIN = 300
+
+# Never refresh more often than this, guards against very short lived tokens
+MIN_REFRESH_DELAY = 10
+
+# Stats entries type of the logins, outside of the Aggregated stats as their
+# requests are already counted there
+AUTH = "AUTH"
+
+
+@dataclass
+class CachedToken:
+    username: str
+    identity: Identity
+    # Shared with every user of the same username, refreshed in place
+    header: dict
+    cookies: RequestsCookieJar
+    refresh_path: str
+    expires_at: float
+    refresher: Optional[gevent.Greenlet] = field(default=None, repr=False)
+
+    def is_fresh(self, margin) -> bool:
+        return self.expires_at - time.time() > margin
+
+
+def _log(stats, name, started, exception=None):
+    if stats is None:
+        return
+    entry = stats.get(name, AUTH)
+    if exception is not None:
+        entry.log_error(exception)
+        return
+    entry.log((time.perf_counter() - started) * 1000, 0)
+
+
+class TokenCache:
+    # Per-worker cache of Backstage identities keyed by username.
+    # The first user of a username performs the login, later users (and restarted users)
+    # reuse the token, which is refreshed in the background before it expires.
+
+    def __init__(self, refresh_margin=REFRESH_MARGIN):
+        self.refresh_margin = refresh_margin
+        self._tokens = {}
+        self._locks = defaultdict(Semaphore)
+
+    def get(self, username, login, host, refresh_path, stats=None) -> CachedToken:
+        # `login` is called with no arguments and returns the `Identity` and the cookie jar of the session,
+        # the logins are timed in the `stats` (RequestStats) entry "token login"
+        with self._locks[username]:
+            cached = self._tokens.get(username)
+            if cached is not None and cached.is_fresh(self.refresh_margin):
+                return cached
+
+            started = time.perf_counter()
+            try:
+                identity, cookies = login()
+            except Exception as e:
+                _log(stats, "token login", started, e)
+                raise
+            _log(stats, "token login", started)
+            return self._store(username, identity, cookies, host, refresh_path)
+
+    def seed(self, username, identity, cookies, host, refresh_path) -> CachedToken:
+        # Stores an identity obtained elsewhere (e.g. minted by the master)
+        with self._locks[username]:
+            cached = self._tokens.get(username)
+            if cached is not None and cached.identity.token == identity.token:
+                return cached
+            return self._store(username, identity, cookies, host, refresh_path)
+
+    def _store(self, username, identity, cookies, host, refresh_path) -> CachedToken:
+        cached = self._tokens.get(username)
+        if cached is None:
+            cached = CachedToken(username, identity, identity.header, RequestsCookieJar(),
+                                 refresh_path, 0.0)
+            self._tokens[username] = cached
+        self._update(cached, identity, cookies)
+        self._schedule(cached, host)
+        return cached
+
+    def _update(self, cached, identity, cookies=None):
+        cached.identity = identity
+        cached.header.update(identity.header)
+        cached.expires_at = time.time() + identity.expires_in
+        if cookies is not None:
+            cached.cookies.update(cookies)
+
+    def _schedule(self, cached, host):
+        if cached.refresher is not None:
+            cached.refresher.kill(block=False)
+        delay = max(cached.expires_at - time.time() - self.refresh_margin, MIN_REFRESH_DELAY)
+        cached.refresher = gevent.spawn_later(delay, self._refresh, cached, host)
+
+    def _refresh(self, cached, host):
+        session = HttpSession(base_url=host, request_event=events.request, user=None)
+        session.verify = False
+        session.cookies.update(cached.cookies)
+        try:
+            r = session.get(cached.refresh_path, name="token refresh")
+            r.raise_for_status()
+            identity = parse_identity(json.loads(r.content))
+        except Exception as e:
+            logging.warning(f"Unable to refresh token of {cached.username}: {e}")
+            # The next user to start with this username logs in again
+            cached.expires_at = 0.0
+            cached.refresher = None
+            return
+        finally:
+            session.close()
+        cached.refresher = None
+        self._update(cached, identity, session.cookies)
+        self._schedule(cached, host)
+
+    def clear(self):
+        for cached in self._tokens.values():
+            if cached.refresher is not None:
+                cached.refresher.kill(block=False)
+        self._tokens.clear()
+
+
+token_cache = TokenCache()
+
+
+def cookies_to_list(jar):
+    return [{"name": c.name, "value": c.value, "domain": c.domain, "path": c.path} for c in jar]
+
+
+def cookies_from_list(data):
+    jar = RequestsCookieJar()
+    for c in data:
+        jar.set(c["name"], c["value"], domain=c["domain"], path=c["path"])
+    return jar
+
+
+def mint_tokens(environment, usernames, concurrency=20):
+    # Logs in all the usernames (or the guest once) concurrently and returns the serializable identities
+    opts = environment.parsed_options
+
+    def mint(username):
+        # The minting logins are not part of the measured load
+        session = HttpSession(base_url=environment.host, request_event=EventHook(), user=None)
+        session.verify = False
+        try:
+            if opts.keycloak_host:
+                identity = keycloak_login(session, environment.host, opts.keycloak_host,
+                                          username, opts.keycloak_password)
+            else:
+                identity = guest_login(session)
+            return {
+                "username": username,
+                "token": identity.token,
+                "ownershipEntityRefs": identity.ownership_refs,
+                "expiresIn": identity.expires_in,
+                "cookies": cookies_to_list(session.cookies),
+            }
+        except Exception as e:
+            logging.warning(f"Unable to mint token of {username}: {e}")
+            return None
+        finally:
+            session.close()
+
+    started = time.perf_counter()
+    minted = [t for t in Pool(concurrency).map(mint, usernames) if t is not None]
+    print(f"Minted {len(minted)}/{len(usernames)} tokens in {time.perf_counter() - started:.1f}s")
+    return minted
+
+
+def seed_minted_tokens(environment, minted, refresh_path):
+    for t in minted:
+        identity = parse_identity({"backstageIdentity": {
+            "token": t["token"],
+            "expiresInSeconds": t["expiresIn"],
+            "identity": {"ownershipEntityRefs": t["ownershipEntityRefs"]},
+        }})
+        token_cache.seed(t["username"], identity, cookies_from_list(t["cookies"]),
+                         environment.host, refresh_path)
+
+
+@events.test_stop.add_listener
+def on_test_stop(environment, **_kwargs):
+    token_cache.clear()
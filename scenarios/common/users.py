@@ -0,0 +1,121 @@
+from collections import deque
+import logging
+import uuid
+
+import gevent
+from gevent.event import AsyncResult
+from locust import events
+from locust.runners import MasterRunner, WorkerRunner
+
+from .auth import GUEST_REFRESH_PATH, OAUTH2_PROXY_REFRESH_PATH
+from .tokens import mint_tokens, seed_minted_tokens
+
+# How long a user waits for the master to hand out a username
+LEASE_TIMEOUT = 60
+
+
+class UsernamePool:
+    # Hands out test usernames on demand, lives on the master (or the local runner).
+    # A username is never leased to two users at the same time. Released usernames are
+    # handed out again before new ones: only the usernames leased from this pool are
+    # released (see acquire_username), so nobody holds them anymore, and the accounts
+    # are a fixed set (t_1..t_N created by the setup) that fresh names would run past.
+
+    def __init__(self, prefix="t_", minted=None):
+        self.prefix = prefix
+        self._next = 1
+        self._released = deque()
+        self._minted = {t["username"]: t for t in minted or []}
+
+    def lease(self, with_username=True) -> dict:
+        if not with_username:
+            return {"username": None, "token": self._minted.get("guest")}
+        if len(self._released) > 0:
+            username = self._released.popleft()
+        else:
+            username = f"{self.prefix}{self._next}"
+            self._next += 1
+        return {"username": username, "token": self._minted.get(username)}
+
+    def release(self, username):
+        self._released.append(username)
+
+
+_pool = None
+
+# Leases requested by the users of this worker, keyed by request id
+_pending = {}
+
+
+def on_username_request(environment, msg, **kwargs):
+    # Fired on the master when a worker asks for a username for one of its users
+    lease = _pool.lease(msg.data["with_username"])
+    lease["id"] = msg.data["id"]
+    environment.runner.send_message("username_response", lease, msg.node_id)
+
+
+def on_username_release(environment, msg, **kwargs):
+    # Fired on the master when a user holding a username stops
+    _pool.release(msg.data)
+
+
+def on_username_response(environment, msg, **kwargs):
+    # Fired on the worker when the master answers a 'username_request'
+    result = _pending.get(msg.data["id"])
+    if result is not None:
+        result.set(msg.data)
+
+
+def acquire_username(environment, default="t_1"):
+    # Returns a unique username for a new user (None in guest mode) and whether one was leased
+    # from the master, only leased usernames are to be released. Pre-mints its token when available
+    opts = environment.parsed_options
+    with_username = bool(opts.keycloak_host)
+    request_id = uuid.uuid4().hex
+    result = AsyncResult()
+    _pending[request_id] = result
+    try:
+        environment.runner.send_message("username_request", {"id": request_id, "with_username": with_username})
+        lease = result.get(timeout=LEASE_TIMEOUT)
+    except gevent.Timeout:
+        logging.warning(f"No username received from master in {LEASE_TIMEOUT}s, falling back to {default}")
+        return (default if with_username else None), False
+    finally:
+        _pending.pop(request_id, None)
+
+    if lease["token"] is not None:
+        refresh_path = OAUTH2_PROXY_REFRESH_PATH if with_username else GUEST_REFRESH_PATH
+        seed_minted_tokens(environment, [lease["token"]], refresh_path)
+    return lease["username"], lease["username"] is not None
+
+
+def release_username(environment, username):
+    if username is not None:
+        environment.runner.send_message("username_release", username)
+
+
+def register_test_users(prefix="t_"):
+    # Hooks the test user sharding into the locust lifecycle, call once per locustfile
+    @events.init.add_listener
+    def on_locust_init(environment, **_kwargs):
+        if not isinstance(environment.runner, WorkerRunner):
+            environment.runner.register_message("username_request", on_username_request)
+            environment.runner.register_message("username_release", on_username_release)
+        if not isinstance(environment.runner, MasterRunner):
+            environment.runner.register_message("username_response", on_username_response)
+
+    @events.test_start.add_listener
+    def on_test_start(environment, **_kwargs):
+        global _pool
+        if isinstance(environment.runner, WorkerRunner):
+            return
+        opts = environment.parsed_options
+        minted = None
+        if opts.pre_mint_tokens:
+            # Log the users in upfront so that they start with the catalog traffic right away
+            if opts.keycloak_host:
+                users = [f"{prefix}{i}" for i in range(1, int(environment.runner.target_user_count) + 1)]
+            else:
+                users = ["guest"]
+            minted = mint_tokens(environment, users, opts.pre_mint_concurrency)
+        _pool = UsernamePool(prefix, minted)
@@ -0,0 +1,83 @@
+import time
+
+import gevent
+from gevent.pool import Pool
+
+ORCHESTRATOR_PATH = "/api/orchestrator/v2"
+
+# Instance states after which SonataFlow no longer runs the workflow
+TERMINAL_STATES = {"COMPLETED", "ABORTED", "ERROR"}
+FAILED_STATES = {"ABORTED", "ERROR"}
+
+# Stats entries type of the finished workflows (outside of the Aggregated stats)
+WORKFLOW = "WORKFLOW"
+
+# Polling backoff: first poll after INITIAL_POLL_DELAY, then BACKOFF times later each time,
+# at most MAX_POLL_DELAY and POLL_RESOLUTION of the time elapsed since the execute request
+INITIAL_POLL_DELAY = 0.5
+BACKOFF = 1.5
+MAX_POLL_DELAY = 5.0
+POLL_RESOLUTION = 0.1
+
+
+def instance_state(response):
+    # The v2 API wraps the instance ({"instance": {...}}), accept a bare instance too
+    try:
+        data = response.json()
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(data, dict):
+        return None
+    instance = data.get("instance", data)
+    return instance.get("state") if isinstance(instance, dict) else None
+
+
+class WorkflowTracker:
+    # Follows workflow instances of a user until they finish, on greenlets of their own so
+    # that the user keeps starting workflows with up to `in_flight` instances tracked.
+    # The time from the execute request to the terminal state is logged as a stats entry
+    # of type WORKFLOW named `workflow-complete:<workflow>`, failing when the instance ends
+    # in ABORTED/ERROR or does not finish within `timeout` seconds.
+    # The terminal state is only seen at the next poll, so the time is an upper bound: up to
+    # POLL_RESOLUTION of the duration (or INITIAL_POLL_DELAY) too long, never more than MAX_POLL_DELAY.
+
+    def __init__(self, user, in_flight=1, timeout=600):
+        self.user = user
+        self.timeout = timeout
+        self._pool = Pool(in_flight)
+
+    def track(self, instance_id, workflow_name, started) -> None:
+        # Blocks while `in_flight` instances are tracked already, `started` is the
+        # time.perf_counter() taken before the execute request
+        self._pool.spawn(self._wait, instance_id, workflow_name, started)
+
+    def _poll(self, instance_id):
+        r = self.user.client.get(f"{ORCHESTRATOR_PATH}/workflows/instances/{instance_id}",
+                                 verify=False,
+                                 headers=self.user.HEADER,
+                                 name="workflow-instance:poll")
+        return instance_state(r)
+
+    def _wait(self, instance_id, workflow_name, started):
+        delay = INITIAL_POLL_DELAY
+        state = None
+        while time.perf_counter() - started < self.timeout:
+            gevent.sleep(delay)
+            state = self._poll(instance_id)
+            if state in TERMINAL_STATES:
+                break
+            elapsed = time.perf_counter() - started
+            delay = min(delay * BACKOFF, MAX_POLL_DELAY, max(INITIAL_POLL_DELAY, elapsed * POLL_RESOLUTION))
+
+        # Logged directly (not through the request event) to keep the workflows out of the
+        # Aggregated stats, their requests are already there
+        entry = self.user.environment.stats.get(f"workflow-complete:{workflow_name}", WORKFLOW)
+        if state not in TERMINAL_STATES:
+            entry.log_error(Exception(f"Workflow instance not finished in {self.timeout}s, last state {state}"))
+        elif state in FAILED_STATES:
+            entry.log_error(Exception(f"Workflow instance finished in {state} state"))
+        else:
+            entry.log((time.perf_counter() - started) * 1000, 0)
+
+    def stop(self):
+        self._pool.kill(block=False)
@@ -1,27 +1,60 @@
-from locust import HttpUser, events, task, between
-from locust.runners import MasterRunner, WorkerRunner
+from locust import events, task
 from urllib3.exceptions import InsecureRequestWarning
-import urllib.parse
+from common import (FastBackstageUser, PageGroup, add_common_arguments, debug_response, depth_bucket,
+                    register_test_users)
+import itertools
 import json
-import re
+import random
+import sys
 import uuid
-import time
 import urllib3
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Any
-from collections import defaultdict
+from functools import cached_property
+from typing import Dict, List, Optional, Tuple
 
 urllib3.disable_warnings(InsecureRequestWarning)
 
 __version__ = "1.0"
 
-usernames = []
-
 class PermitResult():
     ALLOW = "ALLOW"
     DENY = "DENY"
+    CONDITIONAL = "CONDITIONAL"
     ERROR = "ERROR"
 
+
+# Stats entries type of the items sent by the batched authorize mode (outside of the Aggregated
+# stats), response time = items of a request, so that rps * average = items per second
+ITEMS = "ITEMS"
+
+
+class AuthorizeError(Exception):
+    pass
+
+
+# Authorize item ids only need to be unique within a request, a counter is cheaper than uuid4()
+_ID_PREFIX = uuid.uuid4().hex[:12]
+_item_ids = itertools.count()
+_ID_MARKER = "__ITEM_ID__"
+
+
+def next_item_id() -> bytes:
+    return f'"{_ID_PREFIX}-{next(_item_ids)}"'.encode()
+
+
+@dataclass(frozen=True)
+class PreparedAction:
+    # An APIAction compiled once: body serialized and stat names interned per permit result
+    method: str
+    endpoint: str
+    body: Optional[bytes]
+    name_prefix: str
+    names: Dict[str, str]
+
+    def name(self, permit) -> str:
+        return self.names.get(permit) or f"{self.name_prefix}|{permit}"
+
+
 @dataclass
 class APIAction:
     method: str
@@ -29,6 +62,13 @@ class APIAction:
     body: Optional[Dict] = None
     description: str = ""
 
+    def prepare(self, plugin) -> PreparedAction:
+        body = None if self.body is None else json.dumps(self.body).encode()
+        name_prefix = f"[{plugin}] {self.endpoint}"
+        names = {permit: sys.intern(f"{name_prefix}|{permit}")
+                 for permit in (PermitResult.ALLOW, PermitResult.DENY, PermitResult.CONDITIONAL)}
+        return PreparedAction(self.method, self.endpoint, body, name_prefix, names)
+
 
 @dataclass
 class Permission:
@@ -37,6 +77,50 @@ class Permission:
     plugin: str
     workflow: List[APIAction] = field(default_factory=list)
     enabled: bool = True
+    # Resource type of resource permissions, authorized without a resource they get a conditional decision
+    resource_type: Optional[str] = None
+
+    @cached_property
+    def prepared_workflow(self) -> List[PreparedAction]:
+        return [action.prepare(self.plugin) for action in self.workflow]
+
+    @cached_property
+    def auth_name(self) -> str:
+        return sys.intern(f"[AUTH] {self.name}")
+
+    def authorize_item(self, conditional=False) -> Tuple[bytes, bytes]:
+        """Serialized authorize item split around its id"""
+        conditional = conditional and self.resource_type is not None
+        return self._authorize_items[conditional]
+
+    @cached_property
+    def _authorize_items(self) -> Dict[bool, Tuple[bytes, bytes]]:
+        items = {}
+        for conditional in (False, True):
+            permission = {
+                "type": "basic",
+                "name": self.name,
+                "attributes": {
+                    "action": self.action
+                }
+            }
+            if conditional and self.resource_type is not None:
+                permission["type"] = "resource"
+                permission["resourceType"] = self.resource_type
+            item = json.dumps({"id": _ID_MARKER, "permission": permission}).encode()
+            prefix, suffix = item.split(f'"{_ID_MARKER}"'.encode())
+            items[conditional] = (prefix, suffix)
+        return items
+
+
+def authorize_body(permissions, conditional=False) -> bytes:
+    """Authorize request body for the permissions, only the item ids are new"""
+    items = []
+    for perm in permissions:
+        prefix, suffix = perm.authorize_item(conditional)
+        items.append(prefix + next_item_id() + suffix)
+    return b'{"items": [' + b", ".join(items) + b"]}"
+
 
 PERMISSIONS: Dict[str, Permission] = {}
 
@@ -44,6 +128,7 @@ PERMISSIONS["catalog-entity"] = Permission(
     name="catalog-entity",
     action="read",
     plugin="catalog",
+    resource_type="catalog-entity",
     workflow=[
         APIAction("GET", "/api/catalog/entities/by-query?limit=20", description="Query entities with pagination"),
         APIAction("GET", "/api/catalog/entities?filter=kind=Component", description="Filter components"),
@@ -72,6 +157,7 @@ PERMISSIONS["policy-entity"] = Permission(
     name="policy-entity",
     action="read",
     plugin="rbac",
+    resource_type="policy-entity",
     workflow=[
         APIAction("GET", "/api/permission/policies", description="List all policies"),
         APIAction("GET", "/api/permission/roles", description="List all roles"),
@@ -84,6 +170,7 @@ PERMISSIONS["scaffolder-template"] = Permission(
     name="scaffolder-template",
     action="read",
     plugin="scaffolder",
+    resource_type="scaffolder-template",
     workflow=[
         APIAction("GET", "/api/catalog/entities?filter=kind=Template", description="List templates via catalog"),
     ]
@@ -130,204 +217,138 @@ PERMISSIONS["orchestrator.instanceAdminView"] = Permission(
 base_policy_auth = "/api/permission/authorize"
 
 
-def setup_test_users(environment, msg, **kwargs):
-    # Fired when the worker receives a message of type 'test_users'
-    usernames.extend(map(lambda u: u, msg.data))
-    print(f"Usernames: {usernames}")
+register_test_users()
 
 
-@events.init.add_listener
-def on_locust_init(environment, **_kwargs):
-    if isinstance(environment.runner, WorkerRunner):
-        environment.runner.register_message("test_users", setup_test_users)
-
-
-@events.test_start.add_listener
-def on_test_start(environment, **_kwargs):
-    # When the test is started, evenly divides list between
-    # worker nodes to ensure unique data across threads
-    if isinstance(environment.runner, MasterRunner):
-        users = []
-        for i in range(1, int(environment.runner.target_user_count)+1):
-            users.append(f"t_{i}")
-
-        worker_count = environment.runner.worker_count
-        chunk_size = int(len(users) / worker_count)
-        chunk_leftover = int(len(users) % worker_count)
-
-        for i, worker in enumerate(environment.runner.clients):
-            start_index = i * chunk_size
-            end_index = start_index + chunk_size
-            data = users[start_index:end_index]
-            if chunk_leftover > 0 and chunk_leftover > i:
-                data.append(users[worker_count * chunk_size + i])
-            print(f"Setting up test users {data}...")
-            environment.runner.send_message("test_users", data, worker)
-
 @events.init_command_line_parser.add_listener
 def _(parser):
-    parser.add_argument("--page-n-count", type=int, default=0)
-    parser.add_argument("--catalog-tab-n-count", type=int, default=0)
-    parser.add_argument("--keycloak-host", type=str, default="")
-    parser.add_argument("--keycloak-password", is_secret=True, default="")
-    parser.add_argument("--debug", type=bool, default=True)
+    add_common_arguments(parser, debug=True)
     parser.add_argument("--enable-orchestrator", type=bool, default=False)
+    # Batched authorize mode: authorize requests of 1..N items drawn from PERMISSIONS (0 disables it)
+    parser.add_argument("--authorize-batch-max", type=int, default=0)
+    # Send the items with a resource type as resource permissions (conditional decisions)
+    parser.add_argument("--authorize-conditional", type=bool, default=False)
+    # Run the workflows of up to N permissions concurrently (0 runs them one after another)
+    parser.add_argument("--permission-fan-out", type=int, default=0)
 
 
-class ComplexRbacTest(HttpUser):
-    def on_start(self):
-        self.client.verify = False
-        if self.environment.parsed_options.keycloak_host:
-            r = self.client.get('/api/auth/oauth2Proxy/refresh', verify=False, name="[AUTH_SETUP] OAuth2 Refresh")
-            qs_str = urllib.parse.parse_qs(r.url)
-            STATE = qs_str['state']
-            login_cookies = r.cookies
-            pattern = r'action="([^"]*)"'
-            LOGIN_URL_tmp = re.findall(pattern, str(r.content))[0]
-            LOGIN_URL = LOGIN_URL_tmp.replace("&amp;", "&")
-            qs_str = urllib.parse.parse_qs(LOGIN_URL)
-            TAB_ID = qs_str['tab_id']
-            EXECUTION = qs_str['execution']
-
-            param = {'client_id': self.CLIENTID,
-                     'tab_id': TAB_ID, 'execution': EXECUTION}
-            form = {'username': self.USERNAME,
-                    'password': self.PASSWORD, 'credentialId': ''}
-            r = self.client.post(LOGIN_URL, verify=False,
-                                 data=form, params=param, name="[AUTH_SETUP] Keycloak Login")
-
-            r = self.client.get(self.REFRESH_URL, verify=False, name= "[AUTH_SETUP] Keycloak refresh")
-            json_dict = json.loads(r.content)
-            TOKEN = json_dict['backstageIdentity']['token']
-            idetity_refs = json_dict['backstageIdentity']['identity']['ownershipEntityRefs']
-            for id_ref in idetity_refs:
-                if str(id_ref).startswith("group"):
-                    self.GROUP_REF = id_ref
-                    continue
-                if str(id_ref).startswith("user"):
-                    self.USER_REF = id_ref
-
-            self.HEADER = {'Authorization': 'Bearer ' + TOKEN}
-        else:
-            r = self.client.get('/api/auth/guest/refresh', verify=False, name="[AUTH_SETUP] Guest Refresh")
-            json_dict = json.loads(r.content)
-            TOKEN = json_dict['backstageIdentity']['token']
-
-            idetity_refs = json_dict['backstageIdentity']['identity']['ownershipEntityRefs']
-            for id_ref in idetity_refs:
-                if str(id_ref).startswith("user"):
-                    self.USER_REF = id_ref
-                    if "guest" in str(id_ref):
-                        self.GROUP_REF = None
-                        break
-                    continue
-                if str(id_ref).startswith("group"):
-                    self.GROUP_REF = id_ref
-
-            self.HEADER = {'Authorization': 'Bearer ' + TOKEN}
+class ComplexRbacTest(FastBackstageUser):
+    auth_name_prefix = "[AUTH_SETUP]"
 
+    def on_start(self):
+        self._json_headers = {}
+        super().on_start()
         if self.environment.parsed_options.enable_orchestrator:
             self.enable_plugin("orchestrator")
 
-    def __init__(self, parent):
-        super().__init__(parent)
-        self.HEADER = ''
-        if self.environment.parsed_options.keycloak_host:
-            if len(usernames) > 0:
-                self.USERNAME = usernames.pop()
-            else:
-                self.USERNAME = "t_1"
-            kc_host = self.environment.parsed_options.keycloak_host
-            self.KEYCLOAK_URL = f'https://{kc_host}/auth'
-            bs_host = self.environment.host
-            self.REDIRECT_URL = f'{bs_host}/oauth2/callback'
-            self.REFRESH_URL = f'{bs_host}/api/auth/oauth2Proxy/refresh'
-
-            self.PASSWORD = self.environment.parsed_options.keycloak_password
-            self.REALM = "backstage"
-            self.CLIENTID = "backstage"
-
     def enable_plugin(self, plugin):
         for perm_name, perm_config in PERMISSIONS.items():
             if perm_config.plugin == plugin:
                 perm_config.enabled = True
 
+    def json_headers(self) -> dict:
+        # HEADER is refreshed in place by the token cache, follow it
+        if self._json_headers.get("Authorization") != self.HEADER.get("Authorization"):
+            self._json_headers = dict(self.HEADER, **{"Content-Type": "application/json",
+                                                      "Accept": "application/json"})
+        return self._json_headers
+
     def authorize_policy(self, policy, config) -> str:
         r = self.client.post(base_policy_auth,
-                            verify=False,
-                            headers=self.HEADER,
-                            name=f"[AUTH] {policy}",
-                            json={"items": [
-                                    {
-                                        "id": str(uuid.uuid4()),
-                                        "permission": {
-                                            "type": "basic",
-                                            "name": policy,
-                                            "attributes": {
-                                                "action": config.action
-                                            }
-                                        }
-                                    }
-                                ]
-                        })
+                             verify=False,
+                             headers=self.json_headers(),
+                             name=config.auth_name,
+                             data=authorize_body([config]))
         try:
             result = r.json()["items"][0]["result"]
-        except (KeyError, IndexError, json.JSONDecodeError):
+        except (KeyError, IndexError, TypeError, json.JSONDecodeError):
             result = "ERROR"
 
-        if self.environment.parsed_options.debug:
-            size = sum(len(chunk) for chunk in r.iter_content(8196))
-            debug_output = f"\n[DEBUG][authorize_permissions]"
-            debug_output += f", name={policy}"
-            debug_output += f", action={config.action}"
-            debug_output += f", response_size={size}"
-            debug_output += f", permit={result}"
-            debug_output += f", response={r.content}\n"
-            print(debug_output)
+        debug_response(self.environment, r, "authorize_permissions", name=policy, action=config.action, permit=result)
 
         return result
 
-    def execute_action(self, action, permit, policy):
-        endpoint = action.endpoint
-        method = action.method
+    def authorize_batch(self, size, conditional=False) -> Dict[str, int]:
+        """Authorize `size` permissions drawn from PERMISSIONS in one request"""
+        enabled = [perm for perm in PERMISSIONS.values() if perm.enabled]
+        prefix = "[AUTH-BATCH-CONDITIONAL]" if conditional else "[AUTH-BATCH]"
+        # Power of two buckets of sizes (1, 2, 3-4, 5-8, ...) keep the request names bounded
+        r = self.client.post(base_policy_auth,
+                             verify=False,
+                             headers=self.json_headers(),
+                             name=f"{prefix} {depth_bucket(size)}",
+                             data=authorize_body(random.choices(enabled, k=size), conditional))
+        self.environment.stats.get(f"{prefix} items", ITEMS).log(size, 0)
+        results = {}
+        try:
+            for item in r.json()["items"]:
+                results[item["result"]] = results.get(item["result"], 0) + 1
+        except (KeyError, TypeError, json.JSONDecodeError):
+            results[PermitResult.ERROR] = size
+
+        debug_response(self.environment, r, "authorize_batch", size=size, conditional=conditional, results=results)
 
-        if method == "GET":
+        return results
+
+    def execute_action(self, action: PreparedAction, permit):
+        if action.method == "GET":
             r = self.client.get(
-                endpoint,
+                action.endpoint,
                 headers=self.HEADER,
                 verify=False,
-                name=f"[{policy.plugin}] {endpoint}|{permit}"
+                name=action.name(permit)
             )
-        elif method == "POST":
-            body = action.body
+        elif action.method == "POST":
             r = self.client.post(
-                endpoint,
+                action.endpoint,
                 verify=False,
-                headers=self.HEADER,
-                json=body,
-                name=f"[{policy.plugin}] {endpoint}|{permit}"
+                headers=self.json_headers(),
+                data=action.body,
+                name=action.name(permit)
             )
         else:
             r = {}
 
-        if self.environment.parsed_options.debug:
-            size = sum(len(chunk) for chunk in r.iter_content(8196))
-            debug_output = f"\n[DEBUG][api call]"
-            debug_output += f", endpoint={endpoint}"
-            debug_output += f", response_size={size}"
-            debug_output += f", response={r.content}\n"
-            print(debug_output)
+        debug_response(self.environment, r, "api call", endpoint=action.endpoint)
         return r
 
+    def test_permission(self, perm_name, perm) -> PageGroup:
+        """Authorize a permission and run its workflow, timed as a whole"""
+        try:
+            with PageGroup(self, f"permission:{perm_name}", parallel=False) as permission:
+                result = self.authorize_policy(perm_name, perm)
+                if result == PermitResult.ERROR:
+                    raise AuthorizeError(f"Authorizing {perm_name} failed")
+                for action in perm.prepared_workflow:
+                    permission.call(self.execute_action, action, result)
+        except AuthorizeError:
+            # Already logged as the failure of the permission
+            pass
+        return permission
+
+    def test_all_permissions_concurrent(self, fan_out):
+        """Test all enabled permissions, up to `fan_out` of them at a time"""
+        with PageGroup(self, "iteration:all-permissions", concurrency=fan_out) as iteration:
+            for perm_name, perm in PERMISSIONS.items():
+                if perm.enabled:
+                    iteration.call(self.test_permission, perm_name, perm)
+
     @task
     def test_all_permissions_sequential(self):
         """Test all enabled permissions sequentially"""
+        opts = self.environment.parsed_options
+        if opts.authorize_batch_max > 0:
+            self.authorize_batch(random.randint(1, opts.authorize_batch_max), opts.authorize_conditional)
+            return
+        if opts.permission_fan_out > 0:
+            self.test_all_permissions_concurrent(opts.permission_fan_out)
+            return
         for perm_name, perm in PERMISSIONS.items():
             if not perm.enabled:
                 continue
 
             result = self.authorize_policy(perm_name, perm)
             if result != PermitResult.ERROR:
-                for action in perm.workflow:
-                    self.execute_action(action, result, perm)
+                for action in perm.prepared_workflow:
+                    self.execute_action(action, result)
 
@@ -1,17 +1,12 @@
-from locust import HttpUser, events, task
-from locust.runners import MasterRunner, WorkerRunner
+from locust import events, task
 from urllib3.exceptions import InsecureRequestWarning
-import urllib.parse
-import json
-import re
+from common import FastBackstageUser, add_common_arguments, register_test_users
 import urllib3
 
 urllib3.disable_warnings(InsecureRequestWarning)
 
 __version__ = "1"
 
-usernames = []
-
 entity_facets_params = {}
 
 entity_facets_params["kind"] = {
@@ -92,98 +87,16 @@ entities_params["api"] = {
 base_path_facets = "/api/catalog/entity-facets"
 base_path_entities = "/api/catalog/entities"
 
-
-def setup_test_users(environment, msg, **kwargs):
-    # Fired when the worker receives a message of type 'test_users'
-    usernames.extend(map(lambda u: u, msg.data))
-
-
-@events.init.add_listener
-def on_locust_init(environment, **_kwargs):
-    if not isinstance(environment.runner, MasterRunner):
-        environment.runner.register_message("test_users", setup_test_users)
-
-
-@events.test_start.add_listener
-def on_test_start(environment, **_kwargs):
-    # When the test is started, evenly divides list between
-    # worker nodes to ensure unique data across threads
-    if not isinstance(environment.runner, WorkerRunner):
-        users = []
-        for i in range(1, int(environment.runner.target_user_count)+1):
-            users.append(f"t{i}")
-
-        worker_count = environment.runner.worker_count
-        chunk_size = int(len(users) / worker_count)
-        chunk_leftover = int(len(users) % worker_count)
-
-        for i, worker in enumerate(environment.runner.clients):
-            start_index = i * chunk_size
-            end_index = start_index + chunk_size
-            data = users[start_index:end_index]
-            if chunk_leftover > 0 and chunk_leftover > i:
-                data.append(users[worker_count * chunk_size + i])
-            environment.runner.send_message("test_users", data, worker)
+register_test_users(prefix="t")
 
 
 @events.init_command_line_parser.add_listener
 def _(parser):
-    parser.add_argument("--keycloak-host", type=str, default="")
-    parser.add_argument("--keycloak-password", is_secret=True, default="")
-
-
-class MVP1dot1Test(HttpUser):
-
-    def on_start(self):
-        self.client.verify = False
-        if self.environment.parsed_options.keycloak_host:
-            r = self.client.get('/api/auth/oauth2Proxy/refresh', verify=False)
-            qs_str = urllib.parse.parse_qs(r.url)
-            STATE = qs_str['state']
-            login_cookies = r.cookies
-            pattern = r'action="([^"]*)"'
-            LOGIN_URL_tmp = re.findall(pattern, str(r.content))[0]
-            LOGIN_URL = LOGIN_URL_tmp.replace("&amp;", "&")
-            qs_str = urllib.parse.parse_qs(LOGIN_URL)
-            TAB_ID = qs_str['tab_id']
-            EXECUTION = qs_str['execution']
-
-            param = {'client_id': self.CLIENTID,
-                     'tab_id': TAB_ID, 'execution': EXECUTION}
-            form = {'username': self.USERNAME,
-                    'password': self.PASSWORD, 'credentialId': ''}
-            r = self.client.post(LOGIN_URL, verify=False,
-                                 data=form, params=param)
-
-            r = self.client.get(self.REFRESH_URL, verify=False)
-            json_dict = json.loads(r.content)
-            TOKEN = json_dict['backstageIdentity']['token']
-
-            self.HEADER = {'Authorization': 'Bearer ' + TOKEN}
-        else:
-            r = self.client.get('/api/auth/guest/refresh', verify=False)
-            json_dict = json.loads(r.content)
-            TOKEN = json_dict['backstageIdentity']['token']
-
-            self.HEADER = {'Authorization': 'Bearer ' + TOKEN}
-
-    def __init__(self, parent):
-        super().__init__(parent)
-        self.HEADER = ''
-        if self.environment.parsed_options.keycloak_host:
-            if len(usernames) > 0:
-                self.USERNAME = usernames.pop()
-            else:
-                self.USERNAME = "t1"
-            kc_host = self.environment.parsed_options.keycloak_host
-            self.KEYCLOAK_URL = f'https://{kc_host}/auth'
-            bs_host = self.environment.host
-            self.REDIRECT_URL = f'{bs_host}/oauth2/callback'
-            self.REFRESH_URL = f'{bs_host}/api/auth/oauth2Proxy/refresh'
-
-            self.PASSWORD = self.environment.parsed_options.keycloak_password
-            self.REALM = "backstage"
-            self.CLIENTID = "backstage"
+    add_common_arguments(parser)
+
+
+class MVP1dot1Test(FastBackstageUser):
+    default_username = "t1"
 
     def entitiy_facets(self, query) -> None:
         self.client.get(base_path_facets,
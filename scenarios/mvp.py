@@ -1,17 +1,16 @@
-from locust import HttpUser, events, task
-from locust.runners import MasterRunner, WorkerRunner
+from locust import events, task
 from urllib3.exceptions import InsecureRequestWarning
-import urllib.parse
-import json
-import re
+from common import (FastBackstageUser, PacingMixin, add_common_arguments, debug_response, register_test_users,
+                    walk_cursor)
+# Picked up by locust as the shape of the test, it keeps -u/-r/-t and adds --arrival-rate
+# and --capacity-search
+from common import CapacityShape  # noqa: F401
 import urllib3
 
 urllib3.disable_warnings(InsecureRequestWarning)
 
 __version__ = "1"
 
-usernames = []
-
 entity_facets_params = {}
 
 entity_facets_params["kind"] = {
@@ -100,182 +99,30 @@ def get_entities_by_query_params(kind=None, limit=0, user_ref=None, group_ref=No
 base_path_facets = "/api/catalog/entity-facets"
 base_path_entities = "/api/catalog/entities"
 
+register_test_users()
 
-def setup_test_users(environment, msg, **kwargs):
-    # Fired when the worker receives a message of type 'test_users'
-    usernames.extend(map(lambda u: u, msg.data))
-    print(f"Usernames: {usernames}")
-
-
-@events.init.add_listener
-def on_locust_init(environment, **_kwargs):
-    if isinstance(environment.runner, WorkerRunner):
-        environment.runner.register_message("test_users", setup_test_users)
 
+@events.init_command_line_parser.add_listener
+def _(parser):
+    add_common_arguments(parser)
 
-@events.test_start.add_listener
-def on_test_start(environment, **_kwargs):
-    # When the test is started, evenly divides list between
-    # worker nodes to ensure unique data across threads
-    if isinstance(environment.runner, MasterRunner):
-        users = []
-        for i in range(1, int(environment.runner.target_user_count)+1):
-            users.append(f"t_{i}")
-
-        worker_count = environment.runner.worker_count
-        chunk_size = int(len(users) / worker_count)
-        chunk_leftover = int(len(users) % worker_count)
-
-        for i, worker in enumerate(environment.runner.clients):
-            start_index = i * chunk_size
-            end_index = start_index + chunk_size
-            data = users[start_index:end_index]
-            if chunk_leftover > 0 and chunk_leftover > i:
-                data.append(users[worker_count * chunk_size + i])
-            print(f"Setting up test users {data}...")
-            environment.runner.send_message("test_users", data, worker)
 
+class MVP1dot2Test(PacingMixin, FastBackstageUser):
 
-@events.init_command_line_parser.add_listener
-def _(parser):
-    parser.add_argument("--page-n-count", type=int, default=0)
-    parser.add_argument("--catalog-tab-n-count", type=int, default=0)
-    parser.add_argument("--keycloak-host", type=str, default="")
-    parser.add_argument("--keycloak-password", is_secret=True, default="")
-    parser.add_argument("--debug", type=bool, default=False)
-
-
-class MVP1dot2Test(HttpUser):
-
-    def on_start(self):
-        self.client.verify = False
-        if self.environment.parsed_options.keycloak_host:
-            kc_host = self.environment.parsed_options.keycloak_host
-            KEYCLOAK_URL = f'https://{kc_host}'
-            bs_host = self.environment.host
-            REDIRECT_URL = f'{bs_host}/oauth2/callback'
-            REFRESH_URL = f'{bs_host}/api/auth/oauth2Proxy/refresh'
-            REALM = "backstage"
-            CLIENTID = "backstage"
-
-            # Step 1: Get state from refresh URL redirect chain
-            r = self.client.get(REFRESH_URL, verify=False,
-                                allow_redirects=True)
-            parsed = urllib.parse.urlparse(r.url)
-            qs = urllib.parse.parse_qs(parsed.query)
-            state = qs.get('state', [''])[0]
-
-            # Step 2: Request keycloak auth endpoint to get login form
-            auth_url = f'{KEYCLOAK_URL}/realms/{REALM}/protocol/openid-connect/auth'
-            auth_params = {
-                'client_id': CLIENTID,
-                'state': state,
-                'redirect_uri': REDIRECT_URL,
-                'scope': 'openid email profile',
-                'response_type': 'code'
-            }
-            r = self.client.get(auth_url, verify=False,
-                                params=auth_params, allow_redirects=True)
-
-            # Extract action URL from login form
-            pattern = r'action="([^"]*)"'
-            authenticate_url = re.findall(pattern, r.text)[
-                0].replace("&amp;", "&")
-
-            # Extract execution and tab_id from action URL
-            parsed_auth = urllib.parse.urlparse(authenticate_url)
-            auth_qs = urllib.parse.parse_qs(parsed_auth.query)
-            execution = auth_qs.get('execution', [''])[0]
-            tab_id = auth_qs.get('tab_id', [''])[0]
-
-            # Step 3: POST credentials to authenticate
-            form_data = {
-                'username': self.USERNAME,
-                'password': self.PASSWORD,
-                'credentialId': '',
-                'client_id': CLIENTID,
-                'tab_id': tab_id,
-                'execution': execution
-            }
-            r = self.client.post(authenticate_url, verify=False, data=form_data,
-                                 allow_redirects=False)
-
-            # Get redirect URL with authorization code
-            code_url = r.headers.get('Location', '').replace("&amp;", "&")
-
-            # Step 4: Complete OAuth flow - follow the redirect to get token
-            r = self.client.get(code_url, verify=False, allow_redirects=True)
-            json_dict = json.loads(r.content)
-            TOKEN = json_dict['backstageIdentity']['token']
-
-            identity_refs = json_dict['backstageIdentity']['identity']['ownershipEntityRefs']
-            for id_ref in identity_refs:
-                if str(id_ref).startswith("group"):
-                    self.GROUP_REF = id_ref
-                    continue
-                if str(id_ref).startswith("user"):
-                    self.USER_REF = id_ref
-
-            self.HEADER = {'Authorization': 'Bearer ' + TOKEN}
-        else:
-            r = self.client.get('/api/auth/guest/refresh', verify=False)
-            json_dict = json.loads(r.content)
-            TOKEN = json_dict['backstageIdentity']['token']
-
-            identity_refs = json_dict['backstageIdentity']['identity']['ownershipEntityRefs']
-            for id_ref in identity_refs:
-                if str(id_ref).startswith("user"):
-                    self.USER_REF = id_ref
-                    if "guest" in str(id_ref):
-                        self.GROUP_REF = None
-                        break
-                    continue
-                if str(id_ref).startswith("group"):
-                    self.GROUP_REF = id_ref
-
-            self.HEADER = {'Authorization': 'Bearer ' + TOKEN}
-
-    def __init__(self, parent):
-        super().__init__(parent)
-        self.HEADER = ''
-        if self.environment.parsed_options.keycloak_host:
-            if len(usernames) > 0:
-                self.USERNAME = usernames.pop()
-            else:
-                self.USERNAME = "t_1"
-            kc_host = self.environment.parsed_options.keycloak_host
-            self.KEYCLOAK_URL = f'https://{kc_host}'
-            bs_host = self.environment.host
-            self.REDIRECT_URL = f'{bs_host}/oauth2/callback'
-            self.REFRESH_URL = f'{bs_host}/api/auth/oauth2Proxy/refresh'
-
-            self.PASSWORD = self.environment.parsed_options.keycloak_password
-            self.REALM = "backstage"
-            self.CLIENTID = "backstage"
-
-    def entitiy_facets(self, query) -> None:
-        self.client.get(base_path_facets,
-                        verify=False,
-                        headers=self.HEADER,
-                        params=entity_facets_params[query])
+    def entitiy_facets(self, query):
+        return self.client.get(base_path_facets,
+                               verify=False,
+                               headers=self.HEADER,
+                               params=entity_facets_params[query])
 
     def entities_by_query(self, kind=None, limit=0, user_ref=None, group_ref=None, additional_filter={}, additional_params={}):
         r = self.client.get(f"{base_path_entities}/by-query",
                             verify=False,
                             headers=self.HEADER,
                             params=get_entities_by_query_params(kind, limit, user_ref, group_ref, additional_filter, additional_params))
-        if self.environment.parsed_options.debug:
-            size = sum(len(chunk) for chunk in r.iter_content(8196))
-            debug_output = f"\n[DEBUG][entities_by_query]"
-            debug_output += f" kind={kind}"
-            debug_output += f", limit={limit}"
-            debug_output += f", user_ref={user_ref}"
-            debug_output += f", group_ref={group_ref}"
-            debug_output += f", additional_filter={additional_filter}"
-            debug_output += f", additional_params={additional_params}"
-            debug_output += f", response_size={size}"
-            debug_output += f", response={r.content}\n"
-            print(debug_output)
+        debug_response(self.environment, r, "entities_by_query",
+                       kind=kind, limit=limit, user_ref=user_ref, group_ref=group_ref,
+                       additional_filter=additional_filter, additional_params=additional_params)
         return r
 
     def entities_by_refs(self, refs=[]):
@@ -284,98 +131,91 @@ class MVP1dot2Test(HttpUser):
                              verify=False,
                              headers=self.HEADER,
                              json=entity_refs)
-        if self.environment.parsed_options.debug:
-            size = sum(len(chunk) for chunk in r.iter_content(8196))
-            debug_output = f"\n[DEBUG][entities_by_refs]"
-            debug_output += f", refs={refs}"
-            debug_output += f", response_size={size}"
-            debug_output += f", response={r.content}\n"
-            print(debug_output)
+        debug_response(self.environment, r, "entities_by_refs", refs=refs)
+        return r
 
     @task
     def execute(self) -> None:
-        # Load Catalog
         group_ref = self.GROUP_REF
         if "guest" in self.USER_REF:
             group_ref = "group:default/group1"
-        self.entitiy_facets("relations.ownedBy")
-        self.entitiy_facets("kind")
-        self.entitiy_facets("spec.lifecycle")
-        self.entitiy_facets("metadata.tags")
-        self.entitiy_facets("metadata.namespace")
-        self.entities_by_query(kind="component", limit=20)
-        self.entities_by_query(kind="component", limit=20)
-        self.entitiy_facets("component/spec.type")
-        self.entities_by_query(
-            kind="component", limit=0,
-            user_ref=self.USER_REF, group_ref=group_ref)
-        self.entities_by_query(kind="component", limit=0)
-        self.entitiy_facets("component/spec.lifecycle")
-        self.entitiy_facets("component/metadata.tags")
-        self.entitiy_facets("component/metadata.namespace")
-        self.entities_by_refs([group_ref])
-        self.entities_by_query(
-            kind="component", limit=20,
-            user_ref=self.USER_REF, group_ref=group_ref)
-
-        # Switch to API
-        self.entities_by_query(
-            kind="api", limit=20,
-            user_ref=self.USER_REF, group_ref=group_ref)
-        self.entitiy_facets("api/spec.type")
-        self.entities_by_query(
-            kind="api", limit=0,
-            user_ref=self.USER_REF, group_ref=group_ref)
-        self.entities_by_query(kind="api", limit=0)
-        self.entitiy_facets("api/spec.lifecycle")
-        self.entitiy_facets("api/metadata.tags")
-        self.entitiy_facets("api/metadata.namespace")
-
-        # Switch to Component
-        self.entities_by_query(
-            kind="component", limit=20,
-            user_ref=self.USER_REF, group_ref=group_ref)
-        self.entitiy_facets("component/spec.lifecycle")
-        self.entities_by_query(
-            kind="component", limit=0,
-            user_ref=self.USER_REF, group_ref=group_ref)
-        self.entities_by_query(kind="component", limit=0)
-        self.entitiy_facets("component/spec.lifecycle")
-        self.entitiy_facets("component/metadata.tags")
-        self.entitiy_facets("component/metadata.namespace")
-        self.entities_by_refs([group_ref])
-
-        # Select "library"
-        self.entities_by_query(
-            kind="component", limit=20,
-            user_ref=self.USER_REF, group_ref=group_ref,
-            additional_filter={"spec_type": "library"})
-        self.entities_by_query(
-            kind="component", limit=0,
-            user_ref=self.USER_REF, group_ref=group_ref,
-            additional_filter={"spec_type": "library"})
-        self.entities_by_query(
-            kind="component", limit=0,
-            additional_filter={"spec_type": "library"})
-        self.entities_by_query(kind="component", limit=20)
-        self.entities_by_refs([group_ref])
-
-        # Select "all"
-        self.entities_by_query(
-            kind="component", limit=20,
-            group_ref=group_ref)
-        self.entities_by_query(
-            kind="component", limit=0,
-            group_ref=group_ref)
-        self.entities_by_refs([group_ref])
-
-        # Select/Load next page
-        r = self.entities_by_query(
-            kind="component", limit=20,
-            group_ref=group_ref)
-        json_dict = json.loads(r.content)
-        page_info = json_dict["pageInfo"]
-        if len(page_info) > 0:
-            self.entities_by_query(
-                limit=20,
-                additional_params={"cursor": page_info["nextCursor"]})
+
+        with self.page("page:load-catalog") as page:
+            page.call(self.entitiy_facets, "relations.ownedBy")
+            page.call(self.entitiy_facets, "kind")
+            page.call(self.entitiy_facets, "spec.lifecycle")
+            page.call(self.entitiy_facets, "metadata.tags")
+            page.call(self.entitiy_facets, "metadata.namespace")
+            page.call(self.entities_by_query, kind="component", limit=20)
+            page.call(self.entities_by_query, kind="component", limit=20)
+            page.wait()
+            page.call(self.entitiy_facets, "component/spec.type")
+            page.call(self.entities_by_query,
+                      kind="component", limit=0,
+                      user_ref=self.USER_REF, group_ref=group_ref)
+            page.call(self.entities_by_query, kind="component", limit=0)
+            page.call(self.entitiy_facets, "component/spec.lifecycle")
+            page.call(self.entitiy_facets, "component/metadata.tags")
+            page.call(self.entitiy_facets, "component/metadata.namespace")
+            page.call(self.entities_by_refs, [group_ref])
+            page.call(self.entities_by_query,
+                      kind="component", limit=20,
+                      user_ref=self.USER_REF, group_ref=group_ref)
+
+        with self.page("page:switch-to-api") as page:
+            page.call(self.entities_by_query,
+                      kind="api", limit=20,
+                      user_ref=self.USER_REF, group_ref=group_ref)
+            page.call(self.entitiy_facets, "api/spec.type")
+            page.call(self.entities_by_query,
+                      kind="api", limit=0,
+                      user_ref=self.USER_REF, group_ref=group_ref)
+            page.call(self.entities_by_query, kind="api", limit=0)
+            page.call(self.entitiy_facets, "api/spec.lifecycle")
+            page.call(self.entitiy_facets, "api/metadata.tags")
+            page.call(self.entitiy_facets, "api/metadata.namespace")
+
+        with self.page("page:switch-to-component") as page:
+            page.call(self.entities_by_query,
+                      kind="component", limit=20,
+                      user_ref=self.USER_REF, group_ref=group_ref)
+            page.call(self.entitiy_facets, "component/spec.lifecycle")
+            page.call(self.entities_by_query,
+                      kind="component", limit=0,
+                      user_ref=self.USER_REF, group_ref=group_ref)
+            page.call(self.entities_by_query, kind="component", limit=0)
+            page.call(self.entitiy_facets, "component/spec.lifecycle")
+            page.call(self.entitiy_facets, "component/metadata.tags")
+            page.call(self.entitiy_facets, "component/metadata.namespace")
+            page.call(self.entities_by_refs, [group_ref])
+
+        with self.page("page:select-library") as page:
+            page.call(self.entities_by_query,
+                      kind="component", limit=20,
+                      user_ref=self.USER_REF, group_ref=group_ref,
+                      additional_filter={"spec_type": "library"})
+            page.call(self.entities_by_query,
+                      kind="component", limit=0,
+                      user_ref=self.USER_REF, group_ref=group_ref,
+                      additional_filter={"spec_type": "library"})
+            page.call(self.entities_by_query,
+                      kind="component", limit=0,
+                      additional_filter={"spec_type": "library"})
+            page.call(self.entities_by_query, kind="component", limit=20)
+            page.call(self.entities_by_refs, [group_ref])
+
+        with self.page("page:select-all") as page:
+            page.call(self.entities_by_query,
+                      kind="component", limit=20,
+                      group_ref=group_ref)
+            page.call(self.entities_by_query,
+                      kind="component", limit=0,
+                      group_ref=group_ref)
+            page.call(self.entities_by_refs, [group_ref])
+
+        with self.page("page:next-page") as page:
+            page.call(self.entities_by_query,
+                      kind="component", limit=20,
+                      group_ref=group_ref)
+            r = page.wait()[-1]
+            page.call(walk_cursor, self, r, self.environment.parsed_options.cursor_walk_pages)
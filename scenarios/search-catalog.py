@@ -1,5 +1,12 @@
-from locust import HttpUser, task
+import random
+
+from gevent.lock import Semaphore
+from locust import HttpUser, events, task
 from urllib3.exceptions import InsecureRequestWarning
+from common import PacingMixin, SearchQueryGenerator, add_common_arguments, catalog_size, search_pages
+# Picked up by locust as the shape of the test, it keeps -u/-r/-t and adds --arrival-rate
+# and --capacity-search
+from common import CapacityShape  # noqa: F401
 import urllib3
 
 urllib3.disable_warnings(InsecureRequestWarning)
@@ -31,16 +38,64 @@ params["components_by_lifecycle"] = {
 base_path = "/api/search/query"
 
 
-class SearchCatalogTest(HttpUser):
+@events.init_command_line_parser.add_listener
+def _(parser):
+    add_common_arguments(parser)
+    # The four static queries above, or queries generated from the populated catalog (see common/search.py)
+    parser.add_argument("--search-queries", choices=["static", "catalog"], default="static")
+    # Size of the populated catalog, 0 asks the catalog for the number of components/APIs
+    parser.add_argument("--search-component-count", type=int, default=0)
+    parser.add_argument("--search-api-count", type=int, default=0)
+    parser.add_argument("--search-group-count", type=int, default=1)
+    parser.add_argument("--search-zipf-exponent", type=float, default=1.1)
+    # Chance to load the next page of results through pageCursor, up to --search-max-pages pages
+    parser.add_argument("--search-next-page-ratio", type=float, default=0.2)
+    parser.add_argument("--search-max-pages", type=int, default=10)
+
+
+# Query generator shared by the users of the worker
+_generator = None
+_generator_lock = Semaphore()
+
+
+def query_generator(user) -> SearchQueryGenerator:
+    global _generator
+    with _generator_lock:
+        if _generator is None:
+            opts = user.environment.parsed_options
+            components = opts.search_component_count or catalog_size(user, "Component")
+            apis = opts.search_api_count or catalog_size(user, "API")
+            _generator = SearchQueryGenerator(components, apis, opts.search_group_count,
+                                              opts.search_zipf_exponent)
+    return _generator
+
+
+class SearchCatalogTest(PacingMixin, HttpUser):
 
     def on_start(self):
+        super().on_start()
         self.client.verify = False
+        self.generator = None
+        if self.environment.parsed_options.search_queries == "catalog":
+            self.generator = query_generator(self)
 
     def search(self, query="all") -> None:
+        # With --search-queries catalog every task runs a generated query instead
+        if self.generator is not None:
+            self.search_generated()
+            return
         self.client.get(base_path,
                         verify=False,
                         params=params[query])
 
+    def search_generated(self) -> None:
+        opts = self.environment.parsed_options
+        pages = 1
+        while pages < opts.search_max_pages and random.random() < opts.search_next_page_ratio:
+            pages += 1
+        query, query_params = self.generator.next()
+        search_pages(self, query, query_params, pages)
+
     @task
     def searchAll(self) -> None:
         self.search("all")
@@ -0,0 +1,186 @@
+from gevent.lock import Semaphore
+from gevent.pool import Pool
+from locust import constant_pacing, events, task
+from locust.exception import StopUser
+from urllib3.exceptions import InsecureRequestWarning
+from common import (FastBackstageUser, SearchQueryGenerator, add_common_arguments, catalog_size, register_test_users,
+                    search_pages, str2bool)
+import gevent
+import itertools
+import logging
+import random
+import time
+import urllib3
+
+urllib3.disable_warnings(InsecureRequestWarning)
+
+__version__ = "1"
+
+# How fast the search collator makes new catalog entities searchable, under the
+# search load of the readers. The writer registers a catalog location every
+# 1/--freshness-rate seconds and follows the entity defined there until the catalog
+# serves it and until /api/search/query finds it, reported as stats entries of type
+# FRESHNESS (outside of the Aggregated stats, the delays are minutes long):
+#   freshness:catalog     registration to the entity served by the catalog
+#   freshness:searchable  registration to the entity found by the search
+# The locations are --freshness-location-template formatted with the index n, each
+# defining a Component named --freshness-entity-template (e.g. freshness-{n}), the
+# files have to be published (e.g. to the GitHub repository used by create_resource.sh)
+# but not registered before the test. Use a --freshness-start-index not used by a
+# previous run, the search index keeps the deleted entities until it is rebuilt.
+FRESHNESS = "FRESHNESS"
+
+base_path_catalog = "/api/catalog"
+
+register_test_users()
+
+
+@events.init_command_line_parser.add_listener
+def _(parser):
+    add_common_arguments(parser)
+    parser.add_argument("--freshness-location-template", type=str, default="")
+    parser.add_argument("--freshness-entity-template", type=str, default="freshness-{n}")
+    parser.add_argument("--freshness-start-index", type=int, default=1)
+    # Registrations per second (0 disables the writer) and how many entities are followed at the same time
+    parser.add_argument("--freshness-rate", type=float, default=0.1)
+    parser.add_argument("--freshness-in-flight", type=int, default=100)
+    parser.add_argument("--freshness-poll-interval", type=float, default=2.0)
+    parser.add_argument("--freshness-timeout", type=float, default=1800)
+    # Unregister the location once the entity is searchable
+    parser.add_argument("--freshness-cleanup", type=str2bool, default=True)
+    # Generated queries of the readers (see common/search.py), all the users but the writer are readers
+    parser.add_argument("--search-group-count", type=int, default=1)
+    parser.add_argument("--search-zipf-exponent", type=float, default=1.1)
+    parser.add_argument("--search-next-page-ratio", type=float, default=0.2)
+
+
+def searchable(response, name) -> bool:
+    try:
+        results = response.json().get("results") or []
+    except (ValueError, TypeError, AttributeError):
+        return False
+    for result in results:
+        document = result.get("document") or {}
+        if document.get("title") == name or str(document.get("location", "")).endswith(f"/{name}"):
+            return True
+    return False
+
+
+class FreshnessWriter(FastBackstageUser):
+    fixed_count = 1
+
+    def on_start(self):
+        super().on_start()
+        opts = self.environment.parsed_options
+        self._pacing = constant_pacing(1 / opts.freshness_rate) if opts.freshness_rate > 0 else None
+        self._indexes = itertools.count(opts.freshness_start_index)
+        self._followed = Pool(opts.freshness_in_flight)
+
+    def on_stop(self):
+        self._followed.kill(block=False)
+        super().on_stop()
+
+    def wait_time(self):
+        return self._pacing(self) if self._pacing is not None else 0
+
+    def _log(self, name, started, exception=None):
+        entry = self.environment.stats.get(name, FRESHNESS)
+        if exception is not None:
+            logging.warning(str(exception))
+            entry.log_error(exception)
+            return
+        entry.log((time.time() - started) * 1000, 0)
+
+    def _poll_until(self, check, started, timeout):
+        opts = self.environment.parsed_options
+        while time.time() - started < timeout:
+            if check():
+                return True
+            gevent.sleep(opts.freshness_poll_interval)
+        return False
+
+    def follow(self, name, location_id, started):
+        opts = self.environment.parsed_options
+
+        def in_catalog():
+            with self.client.get(f"{base_path_catalog}/entities/by-name/component/default/{name}",
+                                 verify=False,
+                                 headers=self.HEADER,
+                                 name="freshness:poll-catalog",
+                                 catch_response=True) as r:
+                # Not there yet is the expected answer
+                if r.status_code == 404:
+                    r.success()
+                return r.status_code == 200
+
+        def in_search():
+            r = self.client.get("/api/search/query",
+                                verify=False,
+                                headers=self.HEADER,
+                                params={"types[0]": "software-catalog", "term": name},
+                                name="freshness:poll-search")
+            return searchable(r, name)
+
+        for entry, check in (("freshness:catalog", in_catalog), ("freshness:searchable", in_search)):
+            if not self._poll_until(check, started, opts.freshness_timeout):
+                self._log(entry, started, Exception(f"{name} not found in {opts.freshness_timeout}s"))
+                return
+            self._log(entry, started)
+
+        if opts.freshness_cleanup and location_id:
+            self.client.delete(f"{base_path_catalog}/locations/{location_id}",
+                               verify=False,
+                               headers=self.HEADER,
+                               name="freshness:unregister")
+
+    @task
+    def register(self) -> None:
+        opts = self.environment.parsed_options
+        if not opts.freshness_location_template:
+            logging.error("--freshness-location-template is required, the writer stops")
+            raise StopUser()
+        if opts.freshness_rate <= 0:
+            logging.info("--freshness-rate is 0, the writer stops")
+            raise StopUser()
+        n = next(self._indexes)
+        name = opts.freshness_entity_template.format(n=n)
+        started = time.time()
+        with self.client.post(f"{base_path_catalog}/locations",
+                              verify=False,
+                              headers=self.HEADER,
+                              json={"type": "url", "target": opts.freshness_location_template.format(n=n)},
+                              name="freshness:register",
+                              catch_response=True) as r:
+            if r.status_code != 201:
+                r.failure(f"Location of {name} not registered: {r.status_code}")
+                return
+            try:
+                location_id = r.json()["location"]["id"]
+            except (ValueError, TypeError, KeyError):
+                location_id = None
+        self._followed.spawn(self.follow, name, location_id, started)
+
+
+# Query generator shared by the readers of the worker
+_generator = None
+_generator_lock = Semaphore()
+
+
+class SearchReader(FastBackstageUser):
+
+    def on_start(self):
+        global _generator
+        super().on_start()
+        opts = self.environment.parsed_options
+        with _generator_lock:
+            if _generator is None:
+                _generator = SearchQueryGenerator(catalog_size(self, "Component", self.HEADER),
+                                                  catalog_size(self, "API", self.HEADER),
+                                                  opts.search_group_count,
+                                                  opts.search_zipf_exponent)
+
+    @task
+    def search(self) -> None:
+        opts = self.environment.parsed_options
+        query, params = _generator.next()
+        search_pages(self, query, params, 2 if random.random() < opts.search_next_page_ratio else 1, self.HEADER)
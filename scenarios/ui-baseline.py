@@ -11,8 +11,8 @@ from selenium.common.exceptions import (
 from selenium.webdriver.chrome.service import Service
 from selenium import webdriver
 from locust.exception import LocustError
-from locust.runners import MasterRunner, WorkerRunner
 from locust import User, task, events
+from common import acquire_username, add_common_arguments, register_test_users, release_username
 import concurrent.futures
 import os
 import time
@@ -65,50 +65,13 @@ def _env_truthy(name: str) -> bool:
 
 __version__ = "1"
 
-usernames = []
-
 
 @events.init_command_line_parser.add_listener
 def _(parser):
-    parser.add_argument("--page-n-count", type=int, default=0)
-    parser.add_argument("--catalog-tab-n-count", type=int, default=0)
-    parser.add_argument("--keycloak-host", type=str, default="")
-    parser.add_argument("--keycloak-password", is_secret=True, default="")
-    parser.add_argument("--debug", type=bool, default=False)
-
-
-def setup_test_users(environment, msg, **kwargs):
-    # Fired when the worker receives a message of type 'test_users'
-    usernames.extend(map(lambda u: u, msg.data))
-    print(f"Usernames: {usernames}")
-
-
-@events.init.add_listener
-def on_locust_init(environment, **_kwargs):
-    if isinstance(environment.runner, WorkerRunner):
-        environment.runner.register_message("test_users", setup_test_users) 
-
-@events.test_start.add_listener
-def on_test_start(environment, **_kwargs):
-    # When the test is started, evenly divides list between
-    # worker nodes to ensure unique data across threads
-    if isinstance(environment.runner, MasterRunner):
-        users = []
-        for i in range(1, int(environment.runner.target_user_count)+1):
-            users.append(f"t_{i}")
-
-        worker_count = environment.runner.worker_count
-        chunk_size = int(len(users) / worker_count)
-        chunk_leftover = int(len(users) % worker_count)
-
-        for i, worker in enumerate(environment.runner.clients):
-            start_index = i * chunk_size
-            end_index = start_index + chunk_size
-            data = users[start_index:end_index]
-            if chunk_leftover > 0 and chunk_leftover > i:
-                data.append(users[worker_count * chunk_size + i])
-            print(f"Setting up test users {data}...")
-            environment.runner.send_message("test_users", data, worker)
+    add_common_arguments(parser)
+
+
+register_test_users()
 
 
 class UIBaselineTest(User):
@@ -138,12 +101,10 @@ class UIBaselineTest(User):
         self.page_n_count = opts.page_n_count
         self.catalog_tab_n_count = opts.catalog_tab_n_count
         self.user_password = opts.keycloak_password
-        if len(usernames) > 0:
-            self.user_name = usernames.pop()
-        else:
-            self.user_name = "t_1"
 
     def on_start(self):
+        self.user_name, self._leased = acquire_username(self.environment)
+        self.user_name = self.user_name or "t_1"
         self._ensure_driver()
 
     def _chrome_options(self):
@@ -221,6 +182,8 @@ class UIBaselineTest(User):
 
     def on_stop(self):
         self._dispose_driver()
+        if getattr(self, "_leased", False):
+            release_username(self.environment, self.user_name)
 
     @task
     def user_activity(self) -> None: